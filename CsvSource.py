@@ -0,0 +1,189 @@
+import csv
+import struct
+import os.path
+from array import array
+
+
+class CsvSource:
+    """
+    Streaming access to CSV-file(input data) with byte-offset index of rows.
+    Numbers of rows are numbers of CSV records in file, header is row 0.
+    """
+
+    # Index file: mtime_ns, size of CSV-file, then offsets of rows.
+    index_suffix: str = ".idx"
+    index_header = struct.Struct("<qq")
+
+    def __init__(self,
+                 filename: str = "input.csv",
+                 delimiter: str = ',',
+                 quotechar: str = '|',
+                 encoding: str = 'UTF-8',
+                 has_header: bool = False):
+        """
+        :param filename: this file is readable
+        :param delimiter: same as csv.reader
+        :param quotechar: same as csv.reader
+        :param encoding: encoding of CSV-file
+        :param has_header: first row is names of columns
+        """
+        self.filename = filename
+        self.delimiter = delimiter
+        self.quotechar = quotechar
+        self.encoding = encoding
+        self.has_header = has_header
+        self.offsets = None
+        self._header = None
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.build_index())
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _reader(self, lines):
+        return csv.reader(lines, delimiter=self.delimiter, quotechar=self.quotechar)
+
+    def _decode(self, lines, position: list):
+        """
+        Decode binary lines for csv.reader and count bytes read in position[0].
+        """
+        for line in lines:
+            position[0] += len(line)
+            yield line.decode(self.encoding)
+
+    # STREAM
+    def rows(self, start: int = 0):
+        """
+        Generator of rows, file is read once.
+        :param start: number of first ROW
+        :return: generator of (number_row, row)
+        """
+        if start and self.offsets is not None:
+            if start >= len(self.offsets):
+                return
+            offset = self.offsets[start]
+        else:
+            offset = 0
+        with open(self.filename, 'rb') as f:
+            f.seek(offset)
+            idx = start if offset else 0
+            for row in self._reader(self._decode(f, [offset])):
+                if idx >= start:
+                    yield idx, row
+                idx += 1
+
+    def header(self) -> list():
+        """
+        :return: names of columns, empty list if CSV has no header
+        """
+        if not self.has_header:
+            return []
+        if self._header is None:
+            self._header = next((row for _, row in self.rows()), [])
+        return self._header
+
+    def dict_rows(self):
+        """
+        Generator of data rows as dict: name of column -> value.
+        :return: generator of (number_row, dict)
+        """
+        header = self.header()
+        for idx, row in self.rows(start=1 if self.has_header else 0):
+            yield idx, dict(zip(header, row))
+
+    def column(self, name: str):
+        """
+        Generator of values of one column.
+        :param name: name of column from header
+        :return: generator of values
+        """
+        position = self.header().index(name)
+        for _, row in self.rows(start=1):
+            yield row[position] if position < len(row) else ""
+
+    # INDEX
+    def index_filename(self) -> str:
+        return self.filename + self.index_suffix
+
+    def build_index(self, persist: bool = True) -> array:
+        """
+        Build (or load) byte offsets of all rows. File is scanned once,
+        index is invalidated when mtime or size of CSV-file change.
+        :param persist: keep index next to CSV-file
+        :return: array of offsets
+        """
+        if self.offsets is not None:
+            return self.offsets
+        stat = os.stat(self.filename)
+        if persist:
+            self.offsets = self._load_index(stat)
+            if self.offsets is not None:
+                return self.offsets
+
+        offsets = array('Q')
+        position = [0]
+        with open(self.filename, 'rb') as f:
+            reader = self._reader(self._decode(f, position))
+            while True:
+                start = position[0]
+                try:
+                    next(reader)
+                except StopIteration:
+                    break
+                offsets.append(start)
+        self.offsets = offsets
+
+        if persist:
+            self._save_index(stat)
+        return self.offsets
+
+    def _load_index(self, stat):
+        try:
+            with open(self.index_filename(), 'rb') as f:
+                mtime_ns, size = self.index_header.unpack(f.read(self.index_header.size))
+                if (mtime_ns, size) != (stat.st_mtime_ns, stat.st_size):
+                    return None
+                offsets = array('Q')
+                offsets.frombytes(f.read())
+                return offsets
+        except (OSError, struct.error, ValueError):
+            return None
+
+    def _save_index(self, stat) -> None:
+        try:
+            with open(self.index_filename(), 'wb') as f:
+                f.write(self.index_header.pack(stat.st_mtime_ns, stat.st_size))
+                f.write(self.offsets.tobytes())
+        except OSError:
+            pass
+
+    def row(self, number_row: int = 0) -> list():
+        """
+        Random access to row by index, O(1) after index is built.
+        :param number_row: number ROW
+        :return: list of text, empty list if row not exist
+        """
+        offsets = self.build_index()
+        if not 0 <= number_row < len(offsets):
+            return []
+        if self._file is None:
+            self._file = open(self.filename, 'rb')
+        self._file.seek(offsets[number_row])
+        return next(self._reader(self._decode(self._file, [0])), [])
+
+    def row_dict(self, number_row: int = 0) -> dict():
+        """
+        :param number_row: number ROW
+        :return: dict: name of column -> value
+        """
+        return dict(zip(self.header(), self.row(number_row)))
@@ -1,12 +1,172 @@
-import csv
-import six
-import copy
-import pysftp
-import shutil
+from __future__ import annotations
+
+import io
+import re
+import time
+import logging
+import json
+import hashlib
+import string
+import queue
+import threading
+import bisect
+import itertools
 import os.path
-import requests
-from PIL import Image
-from pptx import Presentation
+from typing import TYPE_CHECKING
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from CsvSource import CsvSource
+from RenderManifest import RenderManifest
+from Metrics import Metrics
+
+# Heavy modules (python-pptx, PIL, requests, pysftp, lxml) are imported by
+# the methods which need them: CSV-only or upload-only runs don't load them.
+if TYPE_CHECKING:
+    from PptxTemplate import PptxTemplate
+    from ImageCache import ImageCache
+    from ImageDownloader import ImageDownloader
+    from SftpUploader import SftpUploader
+
+logger = logging.getLogger(__name__)
+
+
+# Result of rendering one CSV row in batch mode.
+# error is None when the deck was written successfully.
+BatchResult = namedtuple("BatchResult", ["number_row", "filename", "error"])
+
+# Compiled placeholders of template, see CsvToPptx.compile_template.
+# Shapes are located by shape_id: it doesn't shift when other shapes are deleted.
+# texts are texts of all runs of paragraph: token may be split between runs.
+ParagraphPlaceholder = namedtuple("ParagraphPlaceholder", ["id_slide", "shape_id", "id_paragraph", "texts"])
+ShapePlaceholder = namedtuple("ShapePlaceholder", ["id_slide", "shape_id", "is_picture"])
+
+# {{column}} token inside text of paragraph.
+PLACEHOLDER_TOKEN = re.compile(r"\{\{\s*([^{}]+?)\s*\}\}")
+
+# Row travelling through stages of CsvToPptx.pipeline.
+PipelineItem = namedtuple("PipelineItem", ["number_row", "row", "prs", "buffer", "filename", "error"])
+
+# End of rows in queue between stages of pipeline.
+_PIPELINE_END = object()
+
+# Per-process state of batch workers: (CsvToPptx, render_row, filename_pattern, optimize).
+_batch_worker = None
+
+
+def _batch_worker_init(csv_filename_input: str,
+                       pptx_filename_input: str,
+                       render_row,
+                       filename_pattern: str,
+                       optimize: bool = False,
+                       settings: dict = None) -> None:
+    """
+    Initializer of batch worker process: read the template once per process.
+    :param settings: see CsvToPptx.worker_settings()
+    """
+    global _batch_worker
+    converter = CsvToPptx(csv_filename_input=csv_filename_input,
+                          pptx_filename_input=pptx_filename_input)
+    converter.apply_worker_settings(settings or {})
+    _batch_worker = (converter,
+                     render_row,
+                     filename_pattern,
+                     optimize)
+
+
+def _batch_worker_render(number_row: int, row: list) -> tuple():
+    """
+    Render one CSV row into its own PPTX-file inside a batch worker.
+    :return: (BatchResult, report of metrics of worker since previous row)
+    """
+    converter, render_row, filename_pattern, optimize = _batch_worker
+    result = converter.render_row_to_file(render_row, filename_pattern, number_row, row, optimize)
+    return result, converter.metrics.pop_report()
+
+
+class _FilenameFormatter(string.Formatter):
+    """
+    str.format for names of output files: value of row must stay one name
+    inside directory of pattern, so "../../x" and "a/b" are rejected.
+    """
+
+    def format_field(self, value, format_spec) -> str:
+        text = super().format_field(value, format_spec)
+        if text in (".", "..") or any(sep in text for sep in ("/", "\\", "\0", os.sep, os.altsep) if sep):
+            raise ValueError("value {0!r} can't be a part of file name".format(text))
+        return text
+
+
+_FILENAME_FORMATTER = _FilenameFormatter()
+
+
+def _format_filename(filename_pattern: str, number_row: int, row) -> str:
+    """
+    Name of output file for row: list gives {0}, {1}..., dict gives {name of column}.
+    :raise ValueError: value is not a safe part of file name, or file is
+                       outside of directory of pattern (text before first field)
+    """
+    if isinstance(row, dict):
+        filename = _FILENAME_FORMATTER.format(filename_pattern, number_row=number_row, **row)
+    else:
+        filename = _FILENAME_FORMATTER.format(filename_pattern, *row, number_row=number_row)
+    dir_pattern = os.path.abspath(os.path.dirname(filename_pattern.split("{", 1)[0]))
+    if os.path.commonpath([dir_pattern, os.path.abspath(filename)]) != dir_pattern:
+        raise ValueError("file {0!r} is outside of {1!r}".format(filename, dir_pattern))
+    return filename
+
+
+def _replace_tokens(texts: tuple, row_dict: dict) -> tuple():
+    """
+    Replace {{column}} tokens in joined text of runs of paragraph. Value goes
+    into run where token starts, rest of token is removed from next runs.
+    :param texts: texts of runs
+    :param row_dict: name of column -> value, unknown columns are left as is
+    :return: new texts of runs
+    """
+    starts = list(itertools.accumulate((len(text) for text in texts), initial=0))
+    texts = list(texts)
+    matches = [m for m in PLACEHOLDER_TOKEN.finditer("".join(texts)) if m.group(1) in row_dict]
+    # From the end: offsets inside runs of earlier tokens don't move.
+    for m in reversed(matches):
+        first = bisect.bisect_right(starts, m.start()) - 1
+        last = bisect.bisect_right(starts, m.end() - 1) - 1
+        head = texts[first][:m.start() - starts[first]]
+        tail = texts[last][m.end() - starts[last]:]
+        for id_run in range(first + 1, last):
+            texts[id_run] = ""
+        if first == last:
+            texts[first] = head + str(row_dict[m.group(1)]) + tail
+        else:
+            texts[first] = head + str(row_dict[m.group(1)])
+            texts[last] = tail
+    return tuple(texts)
+
+
+def _pipeline_stage(stage, queue_in: queue.Queue, queue_out: queue.Queue, workers: int = 1) -> list():
+    """
+    Start threads of one stage of pipeline: item = stage(item), until _PIPELINE_END.
+    Item with error goes to the next stage without changes.
+    :return: list of threads
+    """
+    def work():
+        while True:
+            item = queue_in.get()
+            if item is _PIPELINE_END:
+                # For other threads of this stage.
+                queue_in.put(_PIPELINE_END)
+                return
+            if item.error is None:
+                try:
+                    item = stage(item)
+                except Exception as e:
+                    item = item._replace(prs=None, buffer=None,
+                                         error="{0}: {1}".format(type(e).__name__, e))
+            queue_out.put(item)
+
+    threads = [threading.Thread(target=work, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    return threads
 
 
 class CsvToPptx:
@@ -16,7 +176,14 @@ class CsvToPptx:
     """
 
     dir_base = os.path.dirname(os.path.abspath(__file__))
-    prs = None
+    _prs = None
+    _pptx_template: PptxTemplate = None
+    csv_source: CsvSource = None
+    image_cache: ImageCache = None
+    image_downloader: ImageDownloader = None
+    images_downloaded: dict = None
+    placeholders_paragraphs: list = None
+    placeholders_shapes: dict = None
     CsvFilenameInput: str = ""
     PptxFilenameInput: str = ""
     PptxFilenameOutput: str = ""
@@ -25,6 +192,9 @@ class CsvToPptx:
     sftp_username: str = "user"
     sftp_password: str = "password"
     sftp_dir_target: str = "/public"
+    sftp_connections: int = 4
+    sftp_uploader: SftpUploader = None
+    metrics: Metrics = None
 
     def __init__(self,
                  csv_filename_input: str = "input.csv",
@@ -34,18 +204,61 @@ class CsvToPptx:
         :param PptxFilenameInput: this file is readable
         :param PptxFilenameOutput: this file is writeable
         """
+        self.set_metrics()
         self.set_csv_filename_input(csv_filename_input)
         self.set_pptx_filename_input(pptx_filename_input)
         self.set_pptx_filename_output(pptx_filename_output)
 
+    def set_metrics(self, metrics: Metrics = None) -> None:
+        """
+        :param metrics: timings and counters of stages, None - new Metrics without hook
+        :return: None
+        """
+        self.metrics = metrics or Metrics()
+
     # PPTX
     def set_pptx_filename_input(self, filename: str = "input.pptx") -> None:
         """
-        :param filename: use another file to read
+        :param filename: use another file to read, it is read on first use of template
         :return: None
         """
         self.PptxFilenameInput = filename
-        self.prs = Presentation(self.PptxFilenameInput)
+        self._pptx_template = None
+        self._prs = None
+        self.placeholders_paragraphs = None
+        self.placeholders_shapes = None
+
+    @property
+    def pptx_template(self) -> PptxTemplate:
+        """
+        Template parsed from <<PptxFilenameInput>> on first use.
+        """
+        if self._pptx_template is None:
+            from PptxTemplate import PptxTemplate
+            with self.metrics.timer("template_load"):
+                with open(self.PptxFilenameInput, 'rb') as f:
+                    self._pptx_template = PptxTemplate(f.read())
+        return self._pptx_template
+
+    @property
+    def prs(self):
+        """
+        Current presentation, new copy of template on first use.
+        """
+        if self._prs is None:
+            self.reset_pptx()
+        return self._prs
+
+    @prs.setter
+    def prs(self, prs) -> None:
+        self._prs = prs
+
+    def reset_pptx(self) -> None:
+        """
+        Start a new presentation from template, already parsed in memory.
+        :return: None
+        """
+        self._prs = self.pptx_template.new_presentation()
 
     def set_pptx_filename_output(self, filename: str = "output.pptx") -> None:
         """
@@ -54,12 +267,35 @@ class CsvToPptx:
         """
         self.PptxFilenameOutput = filename
 
-    def save_pptx(self) -> None:
+    def save_pptx(self, optimize: bool = False) -> None:
         """
         Save file with current name <<PptxFilenameOutput>>
+        :param optimize: lossless size optimization, see optimize_pptx_bytes()
         :return:
         """
-        self.prs.save(self.PptxFilenameOutput)
+        if not optimize:
+            with self.metrics.timer("save"):
+                self.pptx_template.save(self.prs, self.PptxFilenameOutput)
+            return
+        with open(self.PptxFilenameOutput, 'wb') as f:
+            f.write(self.save_pptx_to_bytes(optimize=True))
+
+    def save_pptx_to_bytes(self, prs=None, optimize: bool = False) -> bytes:
+        """
+        :param prs: presentation to save, default - current one
+        :param optimize: lossless size optimization, see optimize_pptx_bytes()
+        :return: content of PPTX-file
+        """
+        buffer = io.BytesIO()
+        with self.metrics.timer("save"):
+            self.pptx_template.save(prs or self.prs, buffer)
+        if not optimize:
+            return buffer.getvalue()
+        from PptxOptimizer import optimize_pptx_bytes
+        with self.metrics.timer("optimize"):
+            optimized = optimize_pptx_bytes(buffer.getvalue())
+        self.metrics.count("optimize_saved_bytes", buffer.tell() - len(optimized))
+        return optimized
 
     def pptx_extract_all_text_from_sliders(self) -> list():
         """
@@ -69,17 +305,26 @@ class CsvToPptx:
         text_runs = []
 
         for slide in self.prs.slides:
-            print(slide)
+            logger.debug("%s", slide)
             for shape in slide.shapes:
-                print("    ", shape)
+                logger.debug("    %s", shape)
                 if not shape.has_text_frame:
                     continue
                 for paragraph in shape.text_frame.paragraphs:
                     for run in paragraph.runs:
                         text_runs.append(run.text)
-                        print("        ", run.text)
+                        logger.debug("        %s", run.text)
         return text_runs
 
+    def pptx_extract_text_records(self, filename: str = None):
+        """
+        Fast text extraction from saved PPTX-file, without python-pptx.
+        :param filename: PPTX-file, default - <<PptxFilenameOutput>>
+        :return: generator of TextRecord(slide, shape, paragraph, run, text)
+        """
+        from PptxTextIndex import iter_pptx_text
+        return iter_pptx_text(filename or self.PptxFilenameOutput)
+
     def pptx_delete_placeholder_in_slide(self,
                                          id_slide: int = 0,
                                          id_shape: int = 0) -> None:
@@ -119,39 +364,196 @@ class CsvToPptx:
         :return: None
         """
         if os.path.isfile(filename_default) == False:
-            print("You must have a DEFAULT-file - 'input/default.png'")
+            logger.warning("You must have a DEFAULT-file - '%s'", filename_default)
             return
         if os.path.isfile(filename_img) == False:
             filename_img = filename_default
-        with Image.open(filename_img) as im:
-            w, h = im.size
-        picture_old = self.prs.slides[id_slide].shapes[id_shape]
-        picture_new = self.prs.slides[id_slide].shapes.add_picture(
-            filename_img,
+        self._replace_picture(self.prs.slides[id_slide],
+                              self.prs.slides[id_slide].shapes[id_shape],
+                              filename_img)
+
+    def _replace_picture(self, slide, picture_old, filename_img: str) -> None:
+        """
+        Put new picture at place of old one: same width, centered vertically.
+        Image is prepared once for width of shape, see ImageCache.
+        """
+        image_cache = self.get_image_cache()
+        misses = image_cache.misses
+        started = time.perf_counter()
+        blob, w, h = image_cache.prepare(filename_img, width_emu=picture_old.width)
+        if image_cache.misses == misses:
+            self.metrics.count("image_cache_hit")
+        else:
+            self.metrics.count("image_cache_miss")
+            self.metrics.observe("image_decode", time.perf_counter() - started)
+        picture_new = slide.shapes.add_picture(
+            io.BytesIO(blob),
             left=picture_old.left,
             top=(picture_old.top + picture_old.height / 2)
                 - (picture_old.width * h / w) / 2,
             width=picture_old.width)
+        picture_new.name = picture_old.name
         pic_old = picture_old._element
         pic_new = picture_new._element
         pic_new.parent = pic_old.getparent()
         pic_old.addnext(pic_new)
         pic_old.getparent().remove(pic_old)
 
+    def compile_template(self) -> None:
+        """
+        Index placeholders of template once: paragraphs with {{column}} tokens
+        and shapes by name. Used by render().
+        :return: None
+        """
+        from pptx.enum.shapes import MSO_SHAPE_TYPE
+        self.placeholders_paragraphs = []
+        self.placeholders_shapes = {}
+
+        for id_slide, slide in enumerate(self.prs.slides):
+            for shape in slide.shapes:
+                self.placeholders_shapes.setdefault(shape.name, []).append(
+                    ShapePlaceholder(id_slide, shape.shape_id, shape.shape_type == MSO_SHAPE_TYPE.PICTURE))
+                if not shape.has_text_frame:
+                    continue
+                for id_paragraph, paragraph in enumerate(shape.text_frame.paragraphs):
+                    texts = tuple(run.text for run in paragraph.runs)
+                    if PLACEHOLDER_TOKEN.search("".join(texts)):
+                        self.placeholders_paragraphs.append(
+                            ParagraphPlaceholder(id_slide, shape.shape_id, id_paragraph, texts))
+
+    def render(self, row_dict: dict, filename_default: str = "input/default.png") -> None:
+        """
+        Apply all substitutions of one row to current presentation.
+        {{column}} tokens in paragraphs are replaced by values of row_dict;
+        token split between runs gets format of its first run.
+        Shapes which name is a key of row_dict: picture gets new image
+        (value is path to image-file), text shape gets new text.
+        :param row_dict: name of column -> value
+        :param filename_default: DEFAULT: Path to image-file if value is not a file.
+        :return: None
+        """
+        if self.placeholders_paragraphs is None:
+            self.compile_template()
+
+        slides = {}
+
+        def get_shape(id_slide, shape_id):
+            if id_slide not in slides:
+                slide = self.prs.slides[id_slide]
+                slides[id_slide] = (slide, {shape.shape_id: shape for shape in slide.shapes})
+            return slides[id_slide][0], slides[id_slide][1].get(shape_id)
+
+        for placeholder in self.placeholders_paragraphs:
+            texts = _replace_tokens(placeholder.texts, row_dict)
+            if texts == placeholder.texts:
+                continue
+            _, shape = get_shape(placeholder.id_slide, placeholder.shape_id)
+            runs = shape.text_frame.paragraphs[placeholder.id_paragraph].runs
+            for run, text, text_old in zip(runs, texts, placeholder.texts):
+                if text != text_old:
+                    run.text = text
+
+        for name, value in row_dict.items():
+            for placeholder in self.placeholders_shapes.get(name, ()):
+                slide, shape = get_shape(placeholder.id_slide, placeholder.shape_id)
+                if shape is None:
+                    continue
+                if placeholder.is_picture:
+                    if value.startswith(("http://", "https://")):
+                        value = self.pptx_get_image_from_url(value)
+                    filename_img = value if os.path.isfile(value) else filename_default
+                    if os.path.isfile(filename_img):
+                        self._replace_picture(slide, shape, filename_img)
+                elif shape.has_text_frame:
+                    shape.text_frame.text = str(value)
+
+    def set_image_cache(self, image_cache: ImageCache = None) -> None:
+        """
+        :param image_cache: prepared images to share, None - default ImageCache
+        :return: None
+        """
+        if image_cache is None:
+            from ImageCache import ImageCache
+            image_cache = ImageCache(dir_cache=self.dir_base + "/output/.image_cache")
+        self.image_cache = image_cache
+
+    def worker_settings(self) -> dict():
+        """
+        Settings of this converter which worker processes must repeat:
+        dir_base and arguments of image cache and downloader set on it.
+        :return: dict, picklable
+        """
+        settings = {"dir_base": self.dir_base}
+        if self.image_cache is not None:
+            cache = self.image_cache
+            settings["image_cache"] = dict(dir_cache=cache.dir_cache, max_memory_bytes=cache.max_memory_bytes,
+                                           dpi=cache.dpi, jpeg_quality=cache.jpeg_quality)
+        if self.image_downloader is not None:
+            downloader = self.image_downloader
+            settings["image_downloader"] = dict(dir_cache=downloader.dir_cache, max_workers=downloader.max_workers,
+                                                timeout=downloader.timeout, retries=downloader.retries,
+                                                backoff_factor=downloader.backoff_factor)
+        return settings
+
+    def apply_worker_settings(self, settings: dict) -> None:
+        """
+        :param settings: from worker_settings() of parent converter
+        :return: None
+        """
+        if "dir_base" in settings:
+            self.dir_base = settings["dir_base"]
+        if "image_cache" in settings:
+            from ImageCache import ImageCache
+            self.set_image_cache(ImageCache(**settings["image_cache"]))
+        if "image_downloader" in settings:
+            from ImageDownloader import ImageDownloader
+            self.set_image_downloader(ImageDownloader(**settings["image_downloader"]))
+
+    def get_image_cache(self) -> ImageCache:
+        if self.image_cache is None:
+            self.set_image_cache()
+        return self.image_cache
+
+    def set_image_downloader(self, image_downloader: ImageDownloader = None) -> None:
+        """
+        :param image_downloader: downloader to share, None - default ImageDownloader
+        :return: None
+        """
+        if image_downloader is None:
+            from ImageDownloader import ImageDownloader
+            image_downloader = ImageDownloader(dir_cache=self.dir_base + "/output/.download_cache")
+        self.image_downloader = image_downloader
+        self.images_downloaded = {}
+
+    def get_image_downloader(self) -> ImageDownloader:
+        if self.image_downloader is None:
+            self.set_image_downloader()
+        return self.image_downloader
+
     def pptx_get_image_from_url(self, image_url: str = "http"):
-        try:
-            os.stat(self.dir_base+"/output/")
-        except:
-            os.mkdir(self.dir_base+"/output/")
-        filename = image_url.split("/")[-1]
-        r = requests.get(image_url, stream = True)# Check if the image was retrieved successfully
-        if r.status_code == 200:
-            r.raw.decode_content = True
-            with open(self.dir_base+"/output/" + filename, 'wb') as f:
-                shutil.copyfileobj(r.raw, f)
+        """
+        :param image_url: URL of image
+        :return: path to downloaded file, "" if image was not retrieved
+        """
+        downloader = self.get_image_downloader()
+        if image_url in self.images_downloaded:
+            self.metrics.count("image_fetch_hit")
         else:
-            pass
-        return self.dir_base+"/output/" + filename
+            with self.metrics.timer("image_fetch"):
+                self.images_downloaded[image_url] = downloader.fetch(image_url)
+        return self.images_downloaded[image_url]
+
+    def pptx_get_images_from_urls(self, image_urls) -> dict():
+        """
+        Download many images concurrently.
+        :param image_urls: iterable of URL
+        :return: dict: URL -> path to file ("" if image was not retrieved)
+        """
+        downloader = self.get_image_downloader()
+        with self.metrics.timer("image_prefetch"):
+            self.images_downloaded.update(downloader.prefetch(
+                url for url in image_urls if url not in self.images_downloaded))
+        return self.images_downloaded
 
     # CSV
     def set_csv_filename_input(self, filename: str = "input.csv") -> None:
@@ -160,31 +562,64 @@ class CsvToPptx:
         :return: None
         """
         self.CsvFilenameInput = filename
+        if self.csv_source is not None:
+            self.csv_source.close()
+        self.csv_source = CsvSource(self.CsvFilenameInput, delimiter=',', quotechar='|')
 
     def csv_extract_all_text_from_table(self) -> list():
         """
         Method name.
         :return: list of lists of text
         """
-        text_rows = []
+        return [row for _, row in self.csv_source.rows()]
 
-        with open(self.CsvFilenameInput, 'r', encoding='UTF-8', newline='') as csvfile:
-            spamreader = csv.reader(csvfile, delimiter=',', quotechar='|')
-            for row in spamreader:
-                text_rows.append(row)
-        return text_rows
+    def csv_iter_rows(self, start: int = 0):
+        """
+        Stream rows without loading whole CSV into memory.
+        :param start: number of first ROW
+        :return: generator of (number_row, row)
+        """
+        rows = self.csv_source.rows(start=start)
+        while True:
+            with self.metrics.timer("csv_parse"):
+                item = next(rows, None)
+            if item is None:
+                return
+            yield item
 
     def csv_extract_row(self, number_row: int = 0) -> list():
         """
         :param number_row: number ROW
         :return: list of lists of text
         """
-        with open(self.CsvFilenameInput, 'r', encoding='UTF-8', newline='') as csvfile:
-            spamreader = csv.reader(csvfile, delimiter=',', quotechar='|')
-            for idx, row in enumerate(spamreader):
-                if idx == number_row:
-                    return row
-        return []
+        return self.csv_source.row(number_row)
+
+    def csv_extract_header(self) -> list():
+        """
+        First row of CSV, read from start of file without index of rows.
+        :return: names of columns, empty list if CSV is empty
+        """
+        rows = self.csv_source.rows()
+        try:
+            return next(rows, (0, []))[1]
+        finally:
+            rows.close()
+
+    def csv_prefetch_images(self, columns: list = (), skip_rows: int = 1) -> dict():
+        """
+        Download all images of CSV concurrently before render.
+        :param columns: names (from first row) or numbers of columns with URL
+        :param skip_rows: number of first rows to skip (header)
+        :return: dict: URL -> path to file ("" if image was not retrieved)
+        """
+        header = self.csv_extract_header()
+        positions = [header.index(column) if isinstance(column, str) else column
+                     for column in columns]
+        return self.pptx_get_images_from_urls(
+            row[position]
+            for _, row in self.csv_iter_rows(start=skip_rows)
+            for position in positions
+            if position < len(row) and row[position].startswith(("http://", "https://")))
 
     # SFTP
     def set_sftp_host(self, set_host: str = "127.0.0.1") -> None:
@@ -224,6 +659,7 @@ class CsvToPptx:
         self.set_sftp_host_port(set_host=set_host, set_port=set_port)
         self.set_sftp_username_password(set_username=set_username, set_password=set_password)
         self.set_sftp_dir_target(set_dir_target=set_dir_target)
+        import pysftp
         cnopts = pysftp.CnOpts(knownhosts=os.getenv("HOME")+'/.ssh/known_hosts')
         cnopts.hostkeys = None
         with pysftp.Connection(self.sftp_host, port=self.sftp_port,
@@ -241,4 +677,483 @@ class CsvToPptx:
                                set_dir_target=self.sftp_dir_target,
                                set_file_for_send=set_file_for_send)
 
+    def set_sftp_connections(self, set_connections: int = 4) -> None:
+        self.sftp_connections = set_connections
+
+    def get_sftp_uploader(self) -> SftpUploader:
+        """
+        Pool of SFTP sessions with current settings, reused between calls.
+        Opened again when settings change.
+        :return: SftpUploader
+        """
+        settings = (self.sftp_host, self.sftp_port, self.sftp_username,
+                    self.sftp_password, self.sftp_dir_target, self.sftp_connections)
+        uploader = self.sftp_uploader
+        if uploader is None or settings != (uploader.host, uploader.port, uploader.username,
+                                            uploader.password, uploader.dir_target, uploader.connections):
+            if uploader is not None:
+                uploader.close()
+            from SftpUploader import SftpUploader
+            self.sftp_uploader = SftpUploader(*settings)
+        return self.sftp_uploader
+
+    def send_files_to(self, set_files_for_send: list = ()) -> list():
+        """
+        Upload many files in parallel over pool of SFTP sessions.
+        Files already on server with the same content (SHA1) are skipped.
+        :param set_files_for_send: list of local files
+        :return: list of UploadResult
+        """
+        results = self.get_sftp_uploader().upload(set_files_for_send)
+        for result in results:
+            self.observe_upload(result)
+        return results
+
+    def observe_upload(self, result) -> None:
+        """
+        Put UploadResult into metrics: upload (seconds), upload_bytes,
+        upload_skipped, upload_error. Speed is upload_bytes / seconds of upload.
+        """
+        if result.error:
+            self.metrics.count("upload_error")
+            logger.warning("Upload of %s failed: %s", result.filename, result.error)
+        elif result.skipped:
+            self.metrics.count("upload_skipped")
+        else:
+            self.metrics.observe("upload", result.seconds)
+            self.metrics.count("upload_bytes", result.bytes)
+
     # AUTOMATE
+    def csv_iter_rows_for_render(self, render_row=None, skip_rows: int = 0):
+        """
+        Rows for batch_render() and pipeline().
+        :param render_row: None - first row is header, rows are dict
+        :param skip_rows: number of first rows to skip (header)
+        :return: generator of (number_row, row)
+        """
+        if render_row is not None:
+            return self.csv_iter_rows(start=skip_rows)
+        header = self.csv_extract_header()
+        return ((idx, dict(zip(header, row)))
+                for idx, row in self.csv_iter_rows(start=max(skip_rows, 1)))
+
+    def row_digest(self, row, render_row=None) -> str:
+        """
+        Hash of all inputs of deck: template, values of row and content of
+        images (local files and, for render(), URL of pictures).
+        :param row: values of ROW, list or dict(name of column -> value)
+        :param render_row: None - row goes to render()
+        :return: hex digest
+        """
+        sha1 = hashlib.sha1(self.pptx_template.hash.encode())
+        sha1.update(json.dumps(row, ensure_ascii=False, sort_keys=True).encode())
+        items = row.items() if isinstance(row, dict) else enumerate(row)
+        for name, value in items:
+            filename_img = value
+            if render_row is None and value.startswith(("http://", "https://")) and any(
+                    placeholder.is_picture for placeholder in self.placeholders_shapes.get(name, ())):
+                filename_img = self.pptx_get_image_from_url(value)
+            if filename_img and os.path.isfile(filename_img):
+                sha1.update(self.get_image_cache().content_hash(filename_img).encode())
+        return sha1.hexdigest()
+
+    def row_picture_urls(self, row) -> list():
+        """
+        :param row: dict row for render()
+        :return: URL values of columns which are pictures in template
+        """
+        if not isinstance(row, dict):
+            return []
+        return [value for name, value in row.items()
+                if value.startswith(("http://", "https://")) and any(
+                    placeholder.is_picture for placeholder in self.placeholders_shapes.get(name, ()))]
+
+    def csv_iter_rows_changed(self, rows, manifest: RenderManifest, row_id=None, render_row=None,
+                              changed: dict = None, seen: set = None, prefetch_rows: int = 64):
+        """
+        Skip rows which inputs are same as in manifest.
+        :param rows: generator of (number_row, row)
+        :param manifest: RenderManifest of previous run
+        :param row_id: name (dict rows) or number (list rows) of column with ID of row,
+                       None - number of row
+        :param render_row: None - rows go to render()
+        :param changed: filled with number_row -> (ID, digest) of rows to render
+        :param seen: filled with ID of all rows
+        :param prefetch_rows: images of pictures (needed by digest) are downloaded
+                              concurrently for this many rows at once
+        :return: generator of (number_row, row)
+        """
+        if render_row is None and self.placeholders_paragraphs is None:
+            self.compile_template()
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, prefetch_rows))
+            if not batch:
+                return
+            if render_row is None:
+                urls = [url for _, row in batch for url in self.row_picture_urls(row)]
+                if urls:
+                    self.pptx_get_images_from_urls(urls)
+            for idx, row in batch:
+                key = idx if row_id is None else row[row_id]
+                digest = self.row_digest(row, render_row)
+                if seen is not None:
+                    seen.add(str(key))
+                if manifest.is_changed(key, digest):
+                    if changed is not None:
+                        changed[idx] = (key, digest)
+                    yield idx, row
+
+    @staticmethod
+    def manifest_commit(manifest: RenderManifest, results: list, changed: dict, seen: set,
+                        delete=None) -> None:
+        """
+        Remember rendered rows in manifest and forget (and delete) disappeared ones.
+        :param manifest: RenderManifest
+        :param results: list of BatchResult
+        :param changed: number_row -> (ID, digest), see csv_iter_rows_changed()
+        :param seen: ID of all rows of CSV
+        :param delete: callable(filename) for outputs of disappeared rows, None - keep them
+        :return: None
+        """
+        for result in results:
+            if result.error is None and result.number_row in changed:
+                key, digest = changed[result.number_row]
+                manifest.update(key, digest, result.filename)
+        if delete is not None:
+            for key, filename in manifest.missing(seen).items():
+                delete(filename)
+                manifest.remove(key)
+        manifest.save()
+
+    def pipeline(self,
+                 render_row=None,
+                 filename_pattern: str = "{number_row}.pptx",
+                 skip_rows: int = 0,
+                 queue_size: int = 8,
+                 fetch_workers: int = 8,
+                 upload: bool = True,
+                 dir_output: str = None,
+                 manifest: RenderManifest = None,
+                 row_id=None,
+                 delete_missing: bool = False,
+                 optimize: bool = False,
+                 rows=None) -> list():
+        """
+        Read CSV -> fetch images -> render -> serialize -> upload, all stages
+        work at the same time and are joined by bounded queues, so number of
+        rendered decks in memory is limited. Deck goes to SFTP from memory.
+        :param render_row: callable(converter, row) -> None;
+                           None - first row is header, rows go to render() as dict
+                           and URL of pictures are downloaded by fetch stage
+        :param filename_pattern: name of output file (on server and in dir_output)
+        :param skip_rows: number of first rows to skip (header)
+        :param queue_size: limit of rows waiting between two stages
+        :param fetch_workers: number of threads downloading images
+        :param upload: send decks to SFTP, see get_sftp_uploader()
+        :param dir_output: also save decks into this directory, None - don't save
+        :param manifest: render and send only rows changed since last run, None - all rows
+        :param row_id: column with ID of row for manifest, None - number of row
+        :param delete_missing: delete decks (on server and in dir_output) of rows
+                               which are not in CSV any more
+        :param optimize: lossless size optimization of decks before upload
+        :param rows: iterable of (number_row, row) instead of rows of CSV, None - read CSV
+        :return: list of BatchResult ordered by number_row, filename is name of deck
+        """
+        def fetch(item):
+            for url in self.row_picture_urls(item.row):
+                self.pptx_get_image_from_url(url)
+            return item
+
+        def render(item):
+            with self.metrics.timer("render"):
+                self.reset_pptx()
+                if render_row is None:
+                    self.render(item.row)
+                else:
+                    render_row(self, item.row)
+            return item._replace(row=None, prs=self.prs,
+                                 filename=_format_filename(filename_pattern, item.number_row, item.row))
+
+        def serialize(item):
+            buffer = io.BytesIO(self.save_pptx_to_bytes(item.prs, optimize))
+            if dir_output:
+                filename = os.path.join(dir_output, item.filename)
+                os.makedirs(os.path.dirname(filename), exist_ok=True)
+                with open(filename, 'wb') as f:
+                    f.write(buffer.getbuffer())
+            return item._replace(prs=None, buffer=buffer)
+
+        def send(item):
+            if upload:
+                # Rows passed by manifest are changed: never skip them as "same on server".
+                result = uploader.upload_fileobj(item.buffer, item.filename, skip_same=manifest is None)
+                self.observe_upload(result)
+                if result.error:
+                    raise IOError(result.error)
+            return item._replace(buffer=None)
+
+        if render_row is None:
+            self.get_image_downloader()
+            if self.placeholders_paragraphs is None:
+                self.compile_template()
+        uploader = self.get_sftp_uploader() if upload else None
+        queues = [queue.Queue(maxsize=queue_size) for _ in range(4)] + [queue.Queue()]
+        stages = [(fetch, fetch_workers), (render, 1), (serialize, 1),
+                  (send, uploader.connections if upload else 1)]
+        threads = [_pipeline_stage(stage, queues[i], queues[i + 1], workers)
+                   for i, (stage, workers) in enumerate(stages)]
+
+        changed, seen = {}, set()
+        try:
+            if rows is None:
+                rows = self.csv_iter_rows_for_render(render_row, skip_rows)
+            if manifest is not None:
+                rows = self.csv_iter_rows_changed(rows, manifest, row_id, render_row, changed, seen)
+            for idx, row in rows:
+                queues[0].put(PipelineItem(idx, row, None, None, None, None))
+        finally:
+            # Error of reading rows (e.g. bad row_id) must not leave stages waiting forever.
+            for i, stage_threads in enumerate(threads):
+                queues[i].put(_PIPELINE_END)
+                for thread in stage_threads:
+                    thread.join()
+
+        results = []
+        while not queues[-1].empty():
+            item = queues[-1].get()
+            self.metrics.count("rows_failed" if item.error else "rows_rendered")
+            results.append(BatchResult(item.number_row, item.filename, item.error))
+        results.sort(key=lambda result: result.number_row)
+
+        if manifest is not None:
+            def delete(filename):
+                if upload:
+                    uploader.remove(filename)
+                if dir_output and os.path.isfile(os.path.join(dir_output, filename)):
+                    os.remove(os.path.join(dir_output, filename))
+
+            self.manifest_commit(manifest, results, changed, seen, delete if delete_missing else None)
+        return results
+
+    # BATCH
+    def render_row_to_file(self,
+                           render_row,
+                           filename_pattern: str = "output/{number_row}.pptx",
+                           number_row: int = 0,
+                           row: list = (),
+                           optimize: bool = False) -> BatchResult:
+        """
+        Render one row on a fresh copy of template and save it.
+        :param render_row: callable(converter, row) -> None, modify converter.prs;
+                           None - row is dict and goes to render()
+        :param filename_pattern: str.format pattern, gets row values and number_row
+        :param number_row: number ROW
+        :param row: values of ROW, list or dict(name of column -> value)
+        :param optimize: lossless size optimization of deck
+        :return: BatchResult, error is text of exception or None
+        """
+        filename = None
+        try:
+            filename = _format_filename(filename_pattern, number_row, row)
+            with self.metrics.timer("render"):
+                self.reset_pptx()
+                if render_row is None:
+                    self.render(row)
+                else:
+                    render_row(self, row)
+            dir_output = os.path.dirname(filename)
+            if dir_output:
+                os.makedirs(dir_output, exist_ok=True)
+            self.set_pptx_filename_output(filename)
+            self.save_pptx(optimize)
+        except Exception as e:
+            logger.warning("Row %s failed: %s", number_row, e)
+            self.metrics.count("rows_failed")
+            return BatchResult(number_row, filename, "{0}: {1}".format(type(e).__name__, e))
+        self.metrics.count("rows_rendered")
+        return BatchResult(number_row, filename, None)
+
+    def batch_render(self,
+                     render_row,
+                     filename_pattern: str = "output/{number_row}.pptx",
+                     workers: int = None,
+                     skip_rows: int = 0,
+                     manifest: RenderManifest = None,
+                     row_id=None,
+                     delete_missing: bool = False,
+                     optimize: bool = False,
+                     rows=None) -> list():
+        """
+        Render one PPTX-file per CSV row. CSV is read once, template is read
+        once per worker process.
+        :param render_row: callable(converter, row) -> None, must be picklable
+                           (module level function) when workers > 1;
+                           None - first row is header, rows go to render() as dict
+        :param filename_pattern: name of output file, e.g. "output/{0}_{number_row}.pptx"
+                                 or "output/{surname}.pptx" when render_row is None
+        :param workers: number of processes, None - number of CPU, 1 - no pool
+        :param skip_rows: number of first rows to skip (header)
+        :param manifest: render only rows changed since last run, None - all rows
+        :param row_id: column with ID of row for manifest, None - number of row
+        :param delete_missing: delete decks of rows which are not in CSV any more
+        :param optimize: lossless size optimization of decks, done by workers
+        :param rows: iterable of (number_row, row) instead of rows of CSV, None - read CSV
+        :return: list of BatchResult ordered by number_row
+        """
+        workers = workers or os.cpu_count() or 1
+        results = []
+
+        if rows is None:
+            rows = self.csv_iter_rows_for_render(render_row, skip_rows)
+        changed, seen = {}, set()
+        if manifest is not None:
+            rows = self.csv_iter_rows_changed(rows, manifest, row_id, render_row, changed, seen)
+
+        if workers == 1:
+            for idx, row in rows:
+                results.append(self.render_row_to_file(render_row, filename_pattern, idx, row, optimize))
+        else:
+            self._batch_render_pool(render_row, filename_pattern, workers, rows, results, optimize)
+        results.sort(key=lambda result: result.number_row)
+
+        if manifest is not None:
+            def delete(filename):
+                if os.path.isfile(filename):
+                    os.remove(filename)
+
+            self.manifest_commit(manifest, results, changed, seen, delete if delete_missing else None)
+        return results
+
+    def _batch_render_pool(self, render_row, filename_pattern: str, workers: int,
+                           rows, results: list, optimize: bool = False) -> None:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_batch_worker_init,
+                                 initargs=(self.CsvFilenameInput,
+                                           self.PptxFilenameInput,
+                                           render_row,
+                                           filename_pattern,
+                                           optimize,
+                                           self.worker_settings())) as executor:
+            def collect(done):
+                for future in done:
+                    result, report = future.result()
+                    self.metrics.merge(report)
+                    results.append(result)
+
+            # Keep a bounded number of rows in flight, CSV may be huge.
+            pending = set()
+            for idx, row in rows:
+                if len(pending) >= workers * 4:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending.add(executor.submit(_batch_worker_render, idx, row))
+            collect(wait(pending).done)
+
+
+# CLI
+def _cli_render(args) -> int:
+    converter = CsvToPptx(csv_filename_input=args.csv, pptx_filename_input=args.template)
+    manifest = RenderManifest(args.manifest) if args.manifest else None
+    if args.upload:
+        _cli_set_sftp(converter, args)
+        results = converter.pipeline(filename_pattern=args.output, skip_rows=args.skip_rows,
+                                     dir_output=args.dir_output, manifest=manifest, row_id=args.row_id,
+                                     delete_missing=args.delete_missing, optimize=args.optimize)
+    else:
+        results = converter.batch_render(None, os.path.join(args.dir_output or "", args.output),
+                                         workers=args.workers, skip_rows=args.skip_rows,
+                                         manifest=manifest, row_id=args.row_id,
+                                         delete_missing=args.delete_missing, optimize=args.optimize)
+    for result in results:
+        if result.error:
+            print("row {0}: {1}".format(result.number_row, result.error))
+    failed = sum(1 for result in results if result.error)
+    print("Rendered: {0}, failed: {1}".format(len(results) - failed, failed))
+    return 1 if failed else 0
+
+
+def _cli_set_sftp(converter: CsvToPptx, args) -> None:
+    converter.set_sftp_host_port(set_host=args.host, set_port=args.port)
+    converter.set_sftp_username_password(set_username=args.username,
+                                         set_password=os.getenv("CSVTOPPTX_SFTP_PASSWORD", ""))
+    converter.set_sftp_dir_target(set_dir_target=args.dir_target)
+    converter.set_sftp_connections(set_connections=args.connections)
+
+
+def _cli_upload(args) -> int:
+    converter = CsvToPptx()
+    _cli_set_sftp(converter, args)
+    results = converter.send_files_to(args.files)
+    for result in results:
+        print("{0}: {1}".format(result.filename, result.error or ("skipped" if result.skipped else "sent")))
+    return 1 if any(result.error for result in results) else 0
+
+
+def _cli_extract(args) -> int:
+    if args.csv:
+        source = CsvSource(args.csv, delimiter=',', quotechar='|')
+        with source:
+            for number_row, row in source.rows():
+                print("{0}\t{1}".format(number_row, "\t".join(row)))
+        return 0
+    from PptxTextIndex import iter_pptx_text
+    for filename in args.files:
+        for record in iter_pptx_text(filename):
+            print("{0}\t{1}\t{2}\t{3}\t{4}\t{5}".format(filename, record.slide, record.shape,
+                                                        record.paragraph, record.run, record.text))
+    return 0
+
+
+def main(argv=None) -> int:
+    """
+    python CsvToPptx.py render --csv input.csv --template input.pptx --workers 4
+    python CsvToPptx.py render --csv input.csv --template input.pptx --upload --host sftp.example.com
+    python CsvToPptx.py upload --host sftp.example.com output/*.pptx
+    python CsvToPptx.py extract output/1.pptx
+    Password of SFTP is taken from environment variable CSVTOPPTX_SFTP_PASSWORD.
+    :return: exit code
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="CsvToPptx", description="Decks from CSV rows and PPTX template.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log progress and timings.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    sftp = argparse.ArgumentParser(add_help=False)
+    sftp.add_argument("--host", default=CsvToPptx.sftp_host)
+    sftp.add_argument("--port", type=int, default=CsvToPptx.sftp_port)
+    sftp.add_argument("--username", default=CsvToPptx.sftp_username)
+    sftp.add_argument("--dir-target", default=CsvToPptx.sftp_dir_target)
+    sftp.add_argument("--connections", type=int, default=CsvToPptx.sftp_connections)
+
+    render = commands.add_parser("render", parents=[sftp], help="One deck per CSV row, header gives {{column}}.")
+    render.add_argument("--csv", default="input.csv")
+    render.add_argument("--template", default="input.pptx")
+    render.add_argument("--output", default="{number_row}.pptx", help="Name of deck, e.g. {surname}.pptx")
+    render.add_argument("--dir-output", default="output")
+    render.add_argument("--workers", type=int, default=None, help="Processes, default - number of CPU.")
+    render.add_argument("--skip-rows", type=int, default=0)
+    render.add_argument("--manifest", default=None, help="Render only rows changed since last run.")
+    render.add_argument("--row-id", default=None, help="Column with ID of row for manifest.")
+    render.add_argument("--delete-missing", action="store_true")
+    render.add_argument("--optimize", action="store_true", help="Lossless size optimization of decks.")
+    render.add_argument("--upload", action="store_true", help="Send decks to SFTP while rendering.")
+    render.set_defaults(handler=_cli_render)
+
+    upload = commands.add_parser("upload", parents=[sftp], help="Send files to SFTP.")
+    upload.add_argument("files", nargs="+")
+    upload.set_defaults(handler=_cli_upload)
+
+    extract = commands.add_parser("extract", help="Print text of decks (or rows of CSV), tab separated.")
+    extract.add_argument("files", nargs="*")
+    extract.add_argument("--csv", default=None, help="Print rows of this CSV-file instead.")
+    extract.set_defaults(handler=_cli_extract)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
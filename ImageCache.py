@@ -0,0 +1,127 @@
+import io
+import os.path
+import hashlib
+from collections import OrderedDict
+from PIL import Image
+
+
+# python-pptx works in EMU: 914400 per inch.
+EMU_PER_INCH = 914400
+
+
+class ImageCache:
+    """
+    Prepared images for pictures of PPTX: downscaled to box of shape
+    at given DPI and recompressed. Keyed by hash of content of image,
+    kept in memory (LRU, limited by bytes) and on disk.
+    """
+
+    def __init__(self,
+                 dir_cache: str = "output/.image_cache",
+                 max_memory_bytes: int = 64 * 1024 * 1024,
+                 dpi: int = 150,
+                 jpeg_quality: int = 85):
+        """
+        :param dir_cache: directory for prepared images, None - memory only
+        :param max_memory_bytes: limit of prepared images in memory
+        :param dpi: resolution of image in box of shape
+        :param jpeg_quality: quality of recompressed images without alpha
+        """
+        self.dir_cache = dir_cache
+        self.max_memory_bytes = max_memory_bytes
+        self.dpi = dpi
+        self.jpeg_quality = jpeg_quality
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        # (filename, mtime_ns, size) -> hash of content, to not read file again
+        self.hashes = {}
+        self.hits = 0
+        self.misses = 0
+
+    def content_hash(self, filename: str) -> str:
+        stat = os.stat(filename)
+        key = (os.path.abspath(filename), stat.st_mtime_ns, stat.st_size)
+        if key not in self.hashes:
+            sha1 = hashlib.sha1()
+            with open(filename, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    sha1.update(chunk)
+            self.hashes[key] = sha1.hexdigest()
+        return self.hashes[key]
+
+    def prepare(self, filename: str, width_emu: int = 0) -> tuple():
+        """
+        :param filename: Path to image-file.
+        :param width_emu: width of box of shape, 0 - keep size of image
+        :return: (blob, width px, height px) of prepared image
+        """
+        width_px = int(width_emu * self.dpi / EMU_PER_INCH)
+        key = "{0}_{1}_{2}_{3}".format(self.content_hash(filename), width_px, self.dpi, self.jpeg_quality)
+
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return self.memory[key]
+
+        prepared = self._load_disk(key)
+        if prepared is None:
+            self.misses += 1
+            prepared = self._prepare(filename, width_px)
+            self._save_disk(key, prepared)
+        else:
+            self.hits += 1
+        self._remember(key, prepared)
+        return prepared
+
+    def _prepare(self, filename: str, width_px: int) -> tuple():
+        with open(filename, 'rb') as f:
+            original = f.read()
+        with Image.open(io.BytesIO(original)) as im:
+            w, h = im.size
+            if not width_px or w <= width_px:
+                return original, w, h
+            h = max(1, round(h * width_px / w))
+            w = width_px
+            im = im.resize((w, h), Image.LANCZOS)
+            out = io.BytesIO()
+            if im.mode in ("RGBA", "LA", "P"):
+                im.save(out, format="PNG", optimize=True)
+            else:
+                im.convert("RGB").save(out, format="JPEG", quality=self.jpeg_quality, optimize=True)
+        return out.getvalue(), w, h
+
+    def _remember(self, key: str, prepared: tuple) -> None:
+        self.memory[key] = prepared
+        self.memory_bytes += len(prepared[0])
+        while self.memory_bytes > self.max_memory_bytes and len(self.memory) > 1:
+            _, (blob, _, _) = self.memory.popitem(last=False)
+            self.memory_bytes -= len(blob)
+
+    def _disk_filename(self, key: str) -> str:
+        return os.path.join(self.dir_cache, key[:2], key)
+
+    def _load_disk(self, key: str):
+        if not self.dir_cache:
+            return None
+        try:
+            with open(self._disk_filename(key), 'rb') as f:
+                blob = f.read()
+            with Image.open(io.BytesIO(blob)) as im:
+                w, h = im.size
+        except OSError:
+            return None
+        return blob, w, h
+
+    def _save_disk(self, key: str, prepared: tuple) -> None:
+        if not self.dir_cache:
+            return
+        filename = self._disk_filename(key)
+        try:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            # Write under temp name: other workers may read same key.
+            filename_tmp = "{0}.{1}.tmp".format(filename, os.getpid())
+            with open(filename_tmp, 'wb') as f:
+                f.write(prepared[0])
+            os.replace(filename_tmp, filename)
+        except OSError:
+            pass
@@ -0,0 +1,121 @@
+import json
+import os.path
+import hashlib
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class ImageDownloader:
+    """
+    Download images by URL over one pooled HTTP session, concurrently.
+    Files are stored by hash of content (same image from different URLs is
+    kept once), URL -> file is revalidated with ETag/Last-Modified.
+    """
+
+    def __init__(self,
+                 dir_cache: str = "output/.download_cache",
+                 max_workers: int = 16,
+                 timeout: float = 30.0,
+                 retries: int = 3,
+                 backoff_factor: float = 0.5):
+        """
+        :param dir_cache: directory for downloaded files and their metadata
+        :param max_workers: number of concurrent downloads
+        :param timeout: seconds to connect and to read
+        :param retries: number of retries on connection errors and 429/5xx
+        :param backoff_factor: sleep between retries: backoff_factor * 2 ** (retry - 1)
+        """
+        self.dir_cache = dir_cache
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.session = requests.Session()
+        retry = Retry(total=retries, backoff_factor=backoff_factor,
+                      status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        os.makedirs(os.path.join(self.dir_cache, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(self.dir_cache, "urls"), exist_ok=True)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _meta_filename(self, url: str) -> str:
+        return os.path.join(self.dir_cache, "urls", hashlib.sha1(url.encode()).hexdigest() + ".json")
+
+    def _object_filename(self, content_hash: str, url: str) -> str:
+        extension = os.path.splitext(url.split("?")[0].split("/")[-1])[1]
+        return os.path.join(self.dir_cache, "objects", content_hash + extension)
+
+    def _load_meta(self, url: str) -> dict():
+        try:
+            with open(self._meta_filename(url), 'r', encoding='UTF-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not os.path.isfile(meta.get("filename", "")):
+            return {}
+        return meta
+
+    def _save_meta(self, url: str, meta: dict) -> None:
+        filename = self._meta_filename(url)
+        filename_tmp = "{0}.{1}.{2}.tmp".format(filename, os.getpid(), threading.get_ident())
+        with open(filename_tmp, 'w', encoding='UTF-8') as f:
+            json.dump(meta, f)
+        os.replace(filename_tmp, filename)
+
+    def fetch(self, url: str) -> str:
+        """
+        Download one image, or revalidate the cached one.
+        :param url: URL of image
+        :return: path to file, "" if image was not retrieved
+        """
+        meta = self._load_meta(url)
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            r = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException:
+            return meta.get("filename", "")
+        if r.status_code == 304 and meta:
+            return meta["filename"]
+        if r.status_code != 200:
+            return ""
+
+        content_hash = hashlib.sha1(r.content).hexdigest()
+        filename = self._object_filename(content_hash, url)
+        if not os.path.isfile(filename):
+            filename_tmp = "{0}.{1}.{2}.tmp".format(filename, os.getpid(), threading.get_ident())
+            with open(filename_tmp, 'wb') as f:
+                f.write(r.content)
+            os.replace(filename_tmp, filename)
+        self._save_meta(url, {"filename": filename,
+                              "etag": r.headers.get("ETag", ""),
+                              "last_modified": r.headers.get("Last-Modified", "")})
+        return filename
+
+    def prefetch(self, urls) -> dict():
+        """
+        Download many images concurrently, each URL once.
+        :param urls: iterable of URL
+        :return: dict: URL -> path to file ("" if image was not retrieved)
+        """
+        urls = list(dict.fromkeys(url for url in urls if url))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return dict(zip(urls, executor.map(self.fetch, urls)))
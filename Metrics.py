@@ -0,0 +1,85 @@
+import time
+import threading
+from contextlib import contextmanager
+
+
+class Metrics:
+    """
+    Timings and counters of stages of CsvToPptx: total seconds, number of
+    calls and counters. Every observation also goes to hook, e.g. to send
+    it to statsd or Prometheus.
+    """
+
+    def __init__(self, hook=None):
+        """
+        :param hook: callable(name, value), value is seconds for timings
+        """
+        self.hook = hook
+        self.lock = threading.Lock()
+        self.seconds = {}
+        self.calls = {}
+        self.counters = {}
+
+    @contextmanager
+    def timer(self, name: str):
+        """
+        with metrics.timer("render"): ...
+        :param name: name of stage
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self.lock:
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+            self.calls[name] = self.calls.get(name, 0) + 1
+        if self.hook is not None:
+            self.hook(name, seconds)
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        if self.hook is not None:
+            self.hook(name, value)
+
+    def report(self) -> dict():
+        """
+        :return: dict: timings - name -> (calls, seconds), counters - name -> value
+        """
+        with self.lock:
+            return self._report()
+
+    def pop_report(self) -> dict():
+        """
+        Report and start from zero, used to send metrics of worker process.
+        """
+        with self.lock:
+            report = self._report()
+            self.seconds, self.calls, self.counters = {}, {}, {}
+        return report
+
+    def _report(self) -> dict():
+        return {"timings": {name: (self.calls[name], self.seconds[name]) for name in self.seconds},
+                "counters": dict(self.counters)}
+
+    def merge(self, report: dict) -> None:
+        """
+        Add report of other Metrics (e.g. of worker process) and pass it to hook:
+        timing of N calls goes to hook as N observations of average seconds.
+        """
+        with self.lock:
+            for name, (calls, seconds) in report["timings"].items():
+                self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+                self.calls[name] = self.calls.get(name, 0) + calls
+            for name, value in report["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+        if self.hook is None:
+            return
+        for name, (calls, seconds) in report["timings"].items():
+            for _ in range(calls):
+                self.hook(name, seconds / calls)
+        for name, value in report["counters"].items():
+            self.hook(name, value)
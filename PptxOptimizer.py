@@ -0,0 +1,164 @@
+import io
+import os.path
+import hashlib
+import zipfile
+import posixpath
+from lxml import etree
+from concurrent.futures import ProcessPoolExecutor
+
+
+NS_P = "http://schemas.openxmlformats.org/presentationml/2006/main"
+NS_R = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_CT = "http://schemas.openxmlformats.org/package/2006/content-types"
+
+# Relationships which are referenced by r:id in XML of part, so they are
+# not needed when XML doesn't mention them.
+RELTYPES_REFERENCED = ("/image", "/media", "/video", "/audio")
+
+
+def _source_of_rels(rels_name: str) -> str:
+    directory, name = posixpath.split(rels_name)
+    return posixpath.join(posixpath.dirname(directory), name[:-len(".rels")])
+
+
+def _target(source: str, rel) -> str:
+    target = rel.get("Target")
+    if target.startswith("/"):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(source), target))
+
+
+def _is_internal(rel) -> bool:
+    return rel.get("TargetMode") != "External"
+
+
+def optimize_pptx_bytes(data: bytes,
+                        drop_unused_layouts: bool = True,
+                        compresslevel: int = 9) -> bytes:
+    """
+    Lossless size optimization of PPTX-file:
+    - drop relationships to media no more used by XML of part
+      (e.g. after image was replaced or placeholder deleted),
+    - use one media part for identical media,
+    - drop slide layouts not used by any slide (if drop_unused_layouts),
+    - drop parts not reachable from package, recompress zip.
+    :param data: content of PPTX-file
+    :param drop_unused_layouts: remove layouts without slides from masters
+    :param compresslevel: level of deflate, 0-9
+    :return: content of optimized PPTX-file
+    """
+    with zipfile.ZipFile(io.BytesIO(data)) as zin:
+        names = zin.namelist()
+        blobs = {name: zin.read(name) for name in names}
+
+    rels = {_source_of_rels(name): etree.fromstring(blobs[name])
+            for name in names if name.endswith(".rels")}
+
+    # Relationships to media not referenced in XML of its part.
+    for source, tree in rels.items():
+        xml = blobs.get(source)
+        if xml is None or not source.endswith(".xml"):
+            continue
+        for rel in list(tree):
+            if (_is_internal(rel) and rel.get("Type").endswith(RELTYPES_REFERENCED)
+                    and ('"%s"' % rel.get("Id")).encode() not in xml):
+                tree.remove(rel)
+
+    # Identical media -> first of them.
+    canonical = {}
+    by_hash = {}
+    for name in names:
+        if name.startswith("ppt/media/"):
+            canonical[name] = by_hash.setdefault(hashlib.sha1(blobs[name]).hexdigest(), name)
+    for source, tree in rels.items():
+        for rel in tree:
+            if not _is_internal(rel):
+                continue
+            target = _target(source, rel)
+            if canonical.get(target, target) != target:
+                rel.set("Target", posixpath.relpath(canonical[target], posixpath.dirname(source) or "."))
+
+    if drop_unused_layouts:
+        layouts_used = {_target(source, rel)
+                        for source, tree in rels.items() if source.startswith("ppt/slides/")
+                        for rel in tree if rel.get("Type").endswith("/slideLayout")}
+        for source, tree in rels.items():
+            if not source.startswith("ppt/slideMasters/") or source not in blobs:
+                continue
+            layouts = [rel for rel in tree if rel.get("Type").endswith("/slideLayout")]
+            unused = [rel for rel in layouts if _target(source, rel) not in layouts_used]
+            if len(unused) == len(layouts):
+                # Master must keep at least one layout.
+                unused = unused[1:]
+            if not unused:
+                continue
+            master = etree.fromstring(blobs[source])
+            for rel in unused:
+                for layout_id in master.iterfind(".//{%s}sldLayoutId" % NS_P):
+                    if layout_id.get("{%s}id" % NS_R) == rel.get("Id"):
+                        layout_id.getparent().remove(layout_id)
+                tree.remove(rel)
+            blobs[source] = etree.tostring(master, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+    # Parts reachable from package relationships.
+    reachable = set()
+    stack = [""]
+    while stack:
+        source = stack.pop()
+        for rel in rels.get(source, ()):
+            if _is_internal(rel):
+                target = _target(source, rel)
+                if target not in reachable and target in blobs:
+                    reachable.add(target)
+                    stack.append(target)
+
+    content_types = etree.fromstring(blobs["[Content_Types].xml"])
+    for override in list(content_types.iterfind("{%s}Override" % NS_CT)):
+        if override.get("PartName")[1:] not in reachable:
+            content_types.remove(override)
+
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED, compresslevel=compresslevel) as zout:
+        for name in names:
+            if name == "[Content_Types].xml":
+                blob = etree.tostring(content_types, xml_declaration=True, encoding="UTF-8", standalone=True)
+            elif name.endswith(".rels"):
+                source = _source_of_rels(name)
+                if source and source not in reachable:
+                    continue
+                blob = etree.tostring(rels[source], xml_declaration=True, encoding="UTF-8", standalone=True)
+            elif name in reachable:
+                blob = blobs[name]
+            else:
+                continue
+            zout.writestr(name, blob)
+    return out.getvalue()
+
+
+def optimize_pptx(filename_input: str, filename_output: str = None, **kwargs) -> tuple():
+    """
+    :param filename_input: PPTX-file
+    :param filename_output: where to write, None - replace filename_input
+    :param kwargs: see optimize_pptx_bytes()
+    :return: (size before, size after)
+    """
+    with open(filename_input, 'rb') as f:
+        data = f.read()
+    optimized = optimize_pptx_bytes(data, **kwargs)
+    filename_output = filename_output or filename_input
+    filename_tmp = "{0}.{1}.tmp".format(filename_output, os.getpid())
+    with open(filename_tmp, 'wb') as f:
+        f.write(optimized)
+    os.replace(filename_tmp, filename_output)
+    return len(data), len(optimized)
+
+
+def optimize_pptx_many(filenames, workers: int = None) -> list():
+    """
+    Optimize many PPTX-files in place, in process pool.
+    :param filenames: iterable of PPTX-files
+    :param workers: number of processes, None - number of CPU
+    :return: list of (size before, size after)
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(optimize_pptx, filenames, chunksize=4))
@@ -0,0 +1,124 @@
+import io
+import copy
+import hashlib
+import logging
+import zipfile
+import pptx
+from pptx import Presentation
+from pptx.opc.constants import CONTENT_TYPE as CT
+
+# Fast clone uses private API of python-pptx, it may change in any release.
+try:
+    from pptx.package import Package
+    from pptx.opc.oxml import serialize_part_xml
+    from pptx.opc.package import XmlPart, _Relationship
+    from pptx.opc.packuri import PackURI, CONTENT_TYPES_URI, PACKAGE_URI
+    from pptx.opc.serialized import _PhysPkgWriter, _ContentTypesItem
+    _PPTX_INTERNALS = True
+except ImportError:
+    _PPTX_INTERNALS = False
+
+logger = logging.getLogger(__name__)
+
+# Versions of python-pptx whose private API fast clone was checked with.
+PPTX_VERSIONS_TESTED = ("1.0.",)
+
+
+def fast_clone_supported() -> bool:
+    """
+    :return: True if installed python-pptx is one of PPTX_VERSIONS_TESTED
+    """
+    return _PPTX_INTERNALS and pptx.__version__.startswith(PPTX_VERSIONS_TESTED)
+
+
+class PptxTemplate:
+    """
+    PPTX-file parsed once and kept in memory. Each new presentation is a
+    copy of presentation, slides, notes and core properties; slide masters,
+    layouts, themes and media are shared with template and written from
+    original bytes. Shared parts must not be changed. All copied parts are
+    serialized on each save, changed or not.
+    With untested python-pptx (see PPTX_VERSIONS_TESTED) or if the clone
+    doesn't work, each new presentation is parsed from bytes again: slower, safe.
+    """
+
+    # Parts copied for each new presentation, all other parts are shared.
+    # Core properties (title, author...) are set per deck through prs.core_properties.
+    content_types_copied = (CT.PML_PRESENTATION_MAIN, CT.PML_PRES_MACRO_MAIN,
+                            CT.PML_TEMPLATE_MAIN, CT.PML_SLIDESHOW_MAIN,
+                            CT.PML_SLIDE, CT.PML_NOTES_SLIDE, CT.OPC_CORE_PROPERTIES)
+
+    def __init__(self, pptx_template: bytes):
+        """
+        :param pptx_template: content of PPTX-file
+        """
+        self.hash = hashlib.sha1(pptx_template).hexdigest()
+        self.template = pptx_template
+        self.prs = Presentation(io.BytesIO(pptx_template))
+        self.package = self.prs.part.package
+        self.fast = fast_clone_supported()
+        if not self.fast:
+            logger.warning("python-pptx %s is not tested with fast clone of template, "
+                           "presentations are parsed from bytes", pptx.__version__)
+            return
+        with zipfile.ZipFile(io.BytesIO(pptx_template)) as z:
+            self.blobs = {PackURI("/" + name): z.read(name) for name in z.namelist()}
+        self.parts_copied = []
+        self.parts_shared = set()
+        for part in self.package.iter_parts():
+            if isinstance(part, XmlPart) and part.content_type in self.content_types_copied:
+                self.parts_copied.append(part)
+            else:
+                self.parts_shared.add(part)
+        try:
+            self.save(self.new_presentation(), io.BytesIO())
+        except Exception as e:
+            logger.warning("Fast clone of template failed (%s: %s), presentations are parsed from bytes",
+                           type(e).__name__, e)
+            self.fast = False
+
+    @staticmethod
+    def _copy_rels(rels_from, rels_to, copies: dict) -> None:
+        for rId, rel in rels_from.items():
+            target = rel.target_ref if rel.is_external else copies.get(rel.target_part, rel.target_part)
+            rels_to._rels[rId] = _Relationship(rels_to._base_uri, rId, rel.reltype, rel._target_mode, target)
+
+    def new_presentation(self):
+        """
+        :return: independent Presentation, same as template
+        """
+        if not self.fast:
+            return Presentation(io.BytesIO(self.template))
+        package = Package(None)
+        copies = {part: type(part)(part.partname, part.content_type, package, copy.deepcopy(part._element))
+                  for part in self.parts_copied}
+        for part, part_copy in copies.items():
+            self._copy_rels(part.rels, part_copy.rels, copies)
+        self._copy_rels(self.package._rels, package._rels, copies)
+        return package.main_document_part.presentation
+
+    def save(self, prs, file) -> None:
+        """
+        Same as prs.save(file), but parts shared with template are not
+        serialized again.
+        :param prs: Presentation from new_presentation()
+        :param file: path or binary file-like object
+        :return: None
+        """
+        if not self.fast:
+            prs.save(file)
+            return
+        package = prs.part.package
+        parts = tuple(package.iter_parts())
+        with _PhysPkgWriter.factory(file) as phys_writer:
+            phys_writer.write(CONTENT_TYPES_URI, serialize_part_xml(_ContentTypesItem.xml_for(parts)))
+            phys_writer.write(PACKAGE_URI.rels_uri, package._rels.xml)
+            for part in parts:
+                if part in self.parts_shared:
+                    phys_writer.write(part.partname, self.blobs[part.partname])
+                    if part.partname.rels_uri in self.blobs:
+                        phys_writer.write(part.partname.rels_uri, self.blobs[part.partname.rels_uri])
+                    continue
+                phys_writer.write(part.partname, part.blob)
+                if part._rels:
+                    phys_writer.write(part.partname.rels_uri, part.rels.xml)
@@ -0,0 +1,188 @@
+import re
+import os.path
+import sqlite3
+import zipfile
+import posixpath
+from collections import namedtuple
+from xml.etree.ElementTree import iterparse, parse
+
+
+# Text of one run: slide - number of slide, shape - shape_id,
+# paragraph and run - numbers inside shape and paragraph.
+TextRecord = namedtuple("TextRecord", ["slide", "shape", "paragraph", "run", "text"])
+
+NS_P = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+NS_A = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+NS_R = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+NS_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# Elements of slide which are shapes (have own p:cNvPr with id).
+SHAPE_TAGS = {NS_P + "sp", NS_P + "pic", NS_P + "graphicFrame", NS_P + "grpSp", NS_P + "cxnSp"}
+
+# Terms of index: {{column}} placeholders without spaces, other text as lowercase words.
+TERM = re.compile(r"\{\{\s*([^{}]+?)\s*\}\}|(\w+)")
+
+
+def iter_slide_names(zf: zipfile.ZipFile) -> list():
+    """
+    :param zf: opened PPTX-file
+    :return: names of slide parts in zip, in order of slides
+    """
+    rels = parse(zf.open("ppt/_rels/presentation.xml.rels")).getroot()
+    targets = {rel.get("Id"): rel.get("Target") for rel in rels.iter(NS_REL + "Relationship")}
+    presentation = parse(zf.open("ppt/presentation.xml")).getroot()
+    names = []
+    for sld_id in presentation.iter(NS_P + "sldId"):
+        target = targets.get(sld_id.get(NS_R + "id"), "")
+        if target.startswith("/"):
+            names.append(target[1:])
+        elif target:
+            names.append(posixpath.normpath(posixpath.join("ppt", target)))
+    return names
+
+
+def iter_pptx_text(filename: str, paragraphs: bool = False):
+    """
+    Read text of runs straight from XML of slides, without python-pptx.
+    :param filename: PPTX-file
+    :param paragraphs: one record per paragraph (run is -1) with text of all
+                       its runs: PowerPoint often splits {{column}} between runs
+    :return: generator of TextRecord
+    """
+    with zipfile.ZipFile(filename) as zf:
+        for id_slide, name in enumerate(iter_slide_names(zf)):
+            shapes = []
+            pieces = []
+            id_paragraph = id_run = -1
+            for event, element in iterparse(zf.open(name), events=("start", "end")):
+                tag = element.tag
+                if event == "start":
+                    if tag in SHAPE_TAGS:
+                        shapes.append(None)
+                    elif tag == NS_P + "cNvPr" and shapes and shapes[-1] is None:
+                        shapes[-1] = element.get("id")
+                    elif tag == NS_A + "txBody" or tag == NS_P + "txBody":
+                        id_paragraph = -1
+                    elif tag == NS_A + "p":
+                        id_paragraph += 1
+                        id_run = -1
+                        pieces = []
+                    elif tag == NS_A + "r":
+                        id_run += 1
+                    continue
+                if tag == NS_A + "t" and shapes:
+                    if paragraphs:
+                        pieces.append(element.text or "")
+                    else:
+                        yield TextRecord(id_slide, shapes[-1], id_paragraph, id_run, element.text or "")
+                elif tag == NS_A + "p" and paragraphs and shapes and pieces:
+                    yield TextRecord(id_slide, shapes[-1], id_paragraph, -1, "".join(pieces))
+                elif tag in SHAPE_TAGS:
+                    shapes.pop()
+                    element.clear()
+
+
+class PptxTextIndex:
+    """
+    Persistent inverted index: term -> decks (and slides, shapes) where it is.
+    Terms are taken from whole paragraphs, so placeholders split between runs are found.
+    Decks are indexed again only when their mtime or size change.
+    """
+
+    # Version of terms in index, see PRAGMA user_version.
+    version: int = 1
+
+    def __init__(self, filename: str = "pptx_text_index.sqlite3"):
+        """
+        :param filename: SQLite file of index, ":memory:" - not persistent
+        """
+        self.db = sqlite3.connect(filename)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS deck (
+                id INTEGER PRIMARY KEY, filename TEXT UNIQUE, mtime_ns INTEGER, size INTEGER);
+            CREATE TABLE IF NOT EXISTS term (
+                term TEXT, deck_id INTEGER, slide INTEGER, shape TEXT);
+            CREATE INDEX IF NOT EXISTS term_term ON term (term, deck_id);
+            CREATE INDEX IF NOT EXISTS term_deck ON term (deck_id);
+        """)
+        if self.db.execute("PRAGMA user_version").fetchone()[0] < self.version:
+            # Terms of older version are wrong (e.g. per run): index decks again.
+            with self.db:
+                self.db.execute("DELETE FROM term")
+                self.db.execute("DELETE FROM deck")
+                self.db.execute("PRAGMA user_version = {0:d}".format(self.version))
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def terms(text: str) -> list():
+        return ["{{%s}}" % placeholder if placeholder else word.lower()
+                for placeholder, word in TERM.findall(text)]
+
+    def add(self, filename: str) -> bool:
+        """
+        :param filename: PPTX-file
+        :return: True if deck was (re)indexed, False if it is not changed
+        """
+        filename = os.path.abspath(filename)
+        stat = os.stat(filename)
+        row = self.db.execute("SELECT id, mtime_ns, size FROM deck WHERE filename = ?", (filename,)).fetchone()
+        if row is not None and (row[1], row[2]) == (stat.st_mtime_ns, stat.st_size):
+            return False
+        with self.db:
+            if row is not None:
+                self.db.execute("DELETE FROM term WHERE deck_id = ?", (row[0],))
+                self.db.execute("DELETE FROM deck WHERE id = ?", (row[0],))
+            deck_id = self.db.execute("INSERT INTO deck (filename, mtime_ns, size) VALUES (?, ?, ?)",
+                                      (filename, stat.st_mtime_ns, stat.st_size)).lastrowid
+            postings = set()
+            for record in iter_pptx_text(filename, paragraphs=True):
+                for term in self.terms(record.text):
+                    postings.add((term, deck_id, record.slide, record.shape))
+            self.db.executemany("INSERT INTO term (term, deck_id, slide, shape) VALUES (?, ?, ?, ?)", postings)
+        return True
+
+    def add_many(self, filenames) -> int:
+        """
+        :param filenames: iterable of PPTX-files
+        :return: number of decks (re)indexed
+        """
+        return sum(1 for filename in filenames if self.add(filename))
+
+    def remove(self, filename: str) -> None:
+        filename = os.path.abspath(filename)
+        with self.db:
+            self.db.execute("DELETE FROM term WHERE deck_id IN (SELECT id FROM deck WHERE filename = ?)",
+                            (filename,))
+            self.db.execute("DELETE FROM deck WHERE filename = ?", (filename,))
+
+    def search(self, text: str) -> list():
+        """
+        :param text: e.g. "{{name}}" - decks which contain all terms of text
+        :return: list of filenames of decks
+        """
+        terms = sorted(set(self.terms(text)))
+        if not terms:
+            return []
+        sql = " INTERSECT ".join(["SELECT deck_id FROM term WHERE term = ?"] * len(terms))
+        return [row[0] for row in self.db.execute(
+            "SELECT filename FROM deck WHERE id IN ({0}) ORDER BY filename".format(sql), terms)]
+
+    def locate(self, term: str) -> list():
+        """
+        :param term: one term, e.g. "{{name}}"
+        :return: list of (filename, slide, shape) where term is
+        """
+        terms = self.terms(term)
+        if not terms:
+            return []
+        return self.db.execute(
+            "SELECT DISTINCT deck.filename, term.slide, term.shape FROM term JOIN deck ON deck.id = term.deck_id "
+            "WHERE term.term = ? ORDER BY deck.filename, term.slide", (terms[0],)).fetchall()
@@ -0,0 +1,57 @@
+import json
+import os.path
+
+
+class RenderManifest:
+    """
+    What was rendered last time: row ID -> hash of inputs of deck and its
+    filename. Rows with same hash are not rendered and sent again.
+    """
+
+    def __init__(self, filename: str = "manifest.json"):
+        """
+        :param filename: JSON-file of manifest, created if not exist
+        """
+        self.filename = filename
+        self.rows = {}
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.filename, 'r', encoding='UTF-8') as f:
+                self.rows = json.load(f)
+        except (OSError, ValueError):
+            self.rows = {}
+
+    def save(self) -> None:
+        dir_manifest = os.path.dirname(self.filename)
+        if dir_manifest:
+            os.makedirs(dir_manifest, exist_ok=True)
+        filename_tmp = "{0}.{1}.tmp".format(self.filename, os.getpid())
+        with open(filename_tmp, 'w', encoding='UTF-8') as f:
+            json.dump(self.rows, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(filename_tmp, self.filename)
+
+    def is_changed(self, row_id: str, digest: str) -> bool:
+        """
+        :param row_id: ID of row
+        :param digest: hash of inputs of deck
+        :return: True if deck must be rendered
+        """
+        entry = self.rows.get(str(row_id))
+        return entry is None or entry["digest"] != digest
+
+    def update(self, row_id: str, digest: str, filename: str) -> None:
+        self.rows[str(row_id)] = {"digest": digest, "filename": filename}
+
+    def remove(self, row_id: str) -> None:
+        self.rows.pop(str(row_id), None)
+
+    def missing(self, row_ids) -> dict():
+        """
+        :param row_ids: IDs of rows in CSV now
+        :return: dict: row ID -> filename, for rows which disappeared
+        """
+        row_ids = {str(row_id) for row_id in row_ids}
+        return {row_id: entry["filename"] for row_id, entry in self.rows.items()
+                if row_id not in row_ids}
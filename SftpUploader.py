@@ -0,0 +1,246 @@
+import io
+import time
+import queue
+import threading
+import os.path
+import hashlib
+import functools
+import posixpath
+import pysftp
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Result of uploading one file. error is None when the file is on server.
+UploadResult = namedtuple("UploadResult", ["filename", "remote", "bytes", "seconds", "skipped", "error"])
+
+# SHA1 of uploaded file is kept on server in file with this suffix, next to it.
+SHA1_SUFFIX = ".sha1"
+
+
+def upload_speed(result: UploadResult) -> float:
+    """
+    :param result: UploadResult
+    :return: bytes per second
+    """
+    return result.bytes / result.seconds if result.seconds else 0.0
+
+
+class SftpUploader:
+    """
+    Upload many files over a small pool of authenticated SFTP sessions.
+    Sessions are opened once and reused by all uploads.
+    """
+
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 22,
+                 username: str = "user",
+                 password: str = "password",
+                 dir_target: str = "/public",
+                 connections: int = 4,
+                 verify_hash: bool = True):
+        """
+        :param connections: number of SFTP sessions (and parallel uploads)
+        :param verify_hash: skip file only if remote content has same SHA1, kept on server
+                            in <name>.sha1 by upload; False - same size is enough, only for
+                            files whose size changes with content (decks often don't)
+        """
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.dir_target = dir_target
+        self.connections = connections
+        self.verify_hash = verify_hash
+        self.pool = queue.Queue()
+        self.opened = []
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        for sftp in self.opened:
+            if sftp is not None:
+                sftp.close()
+        self.opened = []
+        self.pool = queue.Queue()
+
+    def _connect(self):
+        cnopts = pysftp.CnOpts(knownhosts=os.getenv("HOME")+'/.ssh/known_hosts')
+        cnopts.hostkeys = None
+        return pysftp.Connection(self.host, port=self.port,
+                                 username=self.username,
+                                 password=self.password,
+                                 cnopts=cnopts)
+
+    def _acquire(self):
+        try:
+            return self.pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            can_open = len(self.opened) < self.connections
+            if can_open:
+                self.opened.append(None)
+        if not can_open:
+            return self.pool.get()
+        try:
+            sftp = self._connect()
+        except Exception:
+            with self.lock:
+                self.opened.remove(None)
+            raise
+        with self.lock:
+            self.opened[self.opened.index(None)] = sftp
+        return sftp
+
+    def _release(self, sftp, broken: bool = False) -> None:
+        if broken:
+            with self.lock:
+                self.opened.remove(sftp)
+            sftp.close()
+            return
+        self.pool.put(sftp)
+
+    @staticmethod
+    def _sha1(fileobj) -> str:
+        sha1 = hashlib.sha1()
+        for chunk in iter(lambda: fileobj.read(1024 * 1024), b""):
+            sha1.update(chunk)
+        return sha1.hexdigest()
+
+    def _is_same(self, sftp, remote: str, size: int, sha1_local) -> bool:
+        """
+        Compare size and SHA1 written by upload, remote file itself is never downloaded.
+        File without SHA1 (uploaded by other tool) is not the same: it's uploaded again.
+        """
+        try:
+            if sftp.stat(remote).st_size != size:
+                return False
+        except IOError:
+            return False
+        if not self.verify_hash:
+            return True
+        try:
+            with sftp.open(remote + SHA1_SUFFIX, 'rb') as f:
+                sha1_remote = f.read(256).decode("ascii", "replace").strip()
+        except IOError:
+            return False
+        return sha1_remote == sha1_local()
+
+    @staticmethod
+    def _remove_quiet(sftp, remote: str) -> None:
+        try:
+            sftp.remove(remote)
+        except IOError:
+            pass
+
+    def _upload(self, name: str, remote: str, size, put, sha1_local, skip_same: bool = True) -> UploadResult:
+        """
+        Upload one file: skip if it is already on server (and skip_same), otherwise
+        write under temporary name and rename, so nobody sees half of file.
+        SHA1 is removed before rename and written after it: it never belongs to other content.
+        """
+        started = time.monotonic()
+        sftp = None
+        # Hash is needed by check and by upload: file is read once.
+        sha1_local = functools.lru_cache(maxsize=None)(sha1_local)
+        try:
+            size = size()
+            sftp = self._acquire()
+            if skip_same and self._is_same(sftp, remote, size, sha1_local):
+                self._release(sftp)
+                return UploadResult(name, remote, 0, time.monotonic() - started, True, None)
+            remote_tmp = remote + ".part"
+            put(sftp, remote_tmp)
+            if self.verify_hash:
+                self._remove_quiet(sftp, remote + SHA1_SUFFIX)
+            try:
+                sftp.sftp_client.posix_rename(remote_tmp, remote)
+            except IOError:
+                # Server without posix-rename extension.
+                if sftp.exists(remote):
+                    sftp.remove(remote)
+                sftp.rename(remote_tmp, remote)
+            if self.verify_hash:
+                sftp.putfo(io.BytesIO(sha1_local().encode("ascii")), remote + SHA1_SUFFIX)
+        except Exception as e:
+            if sftp is not None:
+                self._release(sftp, broken=True)
+            return UploadResult(name, remote, 0, time.monotonic() - started, False,
+                                "{0}: {1}".format(type(e).__name__, e))
+        self._release(sftp)
+        return UploadResult(name, remote, size, time.monotonic() - started, False, None)
+
+    def upload_file(self, filename: str, remote_name: str = None) -> UploadResult:
+        """
+        :param filename: local file
+        :param remote_name: name on server, default - basename of filename
+        :return: UploadResult
+        """
+        def sha1_local():
+            with open(filename, 'rb') as f:
+                return self._sha1(f)
+
+        remote = posixpath.join(self.dir_target, remote_name or os.path.basename(filename))
+        return self._upload(filename, remote,
+                            lambda: os.path.getsize(filename),
+                            lambda sftp, remote_tmp: sftp.put(filename, remote_tmp),
+                            sha1_local)
+
+    def upload_fileobj(self, fileobj, remote_name: str, skip_same: bool = True) -> UploadResult:
+        """
+        Upload from memory, without local file.
+        :param fileobj: binary file-like object, e.g. io.BytesIO
+        :param remote_name: name on server
+        :param skip_same: don't upload if the same file is on server;
+                          False - content is known to be new, always upload
+        :return: UploadResult
+        """
+        def size():
+            fileobj.seek(0, os.SEEK_END)
+            return fileobj.tell()
+
+        def put(sftp, remote_tmp):
+            fileobj.seek(0)
+            sftp.putfo(fileobj, remote_tmp)
+
+        def sha1_local():
+            fileobj.seek(0)
+            return self._sha1(fileobj)
+
+        remote = posixpath.join(self.dir_target, remote_name)
+        return self._upload(remote_name, remote, size, put, sha1_local, skip_same)
+
+    def remove(self, remote_name: str) -> bool:
+        """
+        :param remote_name: name on server
+        :return: True if file was removed
+        """
+        remote = posixpath.join(self.dir_target, remote_name)
+        sftp = self._acquire()
+        try:
+            self._remove_quiet(sftp, remote + SHA1_SUFFIX)
+            sftp.remove(remote)
+        except IOError:
+            self._release(sftp)
+            return False
+        except Exception:
+            self._release(sftp, broken=True)
+            raise
+        self._release(sftp)
+        return True
+
+    def upload(self, filenames) -> list():
+        """
+        Upload queue of files in parallel over pool of sessions.
+        :param filenames: iterable of local files
+        :return: list of UploadResult in order of filenames
+        """
+        with ThreadPoolExecutor(max_workers=self.connections) as executor:
+            return list(executor.map(self.upload_file, filenames))
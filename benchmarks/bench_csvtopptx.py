@@ -0,0 +1,101 @@
+"""
+Benchmark of CsvToPptx on synthetic template and CSV.
+
+    python benchmarks/bench_csvtopptx.py --rows 1000 --slides 5 --workers 4
+    python benchmarks/bench_csvtopptx.py --rows 1000 --mode pipeline
+
+Prints rows/sec, peak RSS and timings of stages. Same arguments give the
+same input files (random generator is seeded).
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import resource
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+from pptx import Presentation
+from pptx.util import Inches
+from CsvToPptx import CsvToPptx
+
+
+def make_template(filename: str, slides: int, filename_img: str) -> None:
+    prs = Presentation()
+    for idx in range(slides):
+        slide = prs.slides.add_slide(prs.slide_layouts[5])
+        slide.shapes.title.text = "{{name}} {{surname}} - slide %d" % idx
+        picture = slide.shapes.add_picture(filename_img, Inches(1), Inches(2), width=Inches(3))
+        picture.name = "photo"
+        textbox = slide.shapes.add_textbox(Inches(5), Inches(2), Inches(4), Inches(2))
+        textbox.text_frame.text = "City: {{city}}, e-mail: {{email}}"
+    prs.save(filename)
+
+
+def make_images(dir_images: str, images: int) -> list():
+    filenames = []
+    for idx in range(images):
+        filename = os.path.join(dir_images, "photo_%d.jpg" % idx)
+        Image.new("RGB", (1600, 1200), (idx * 37 % 256, idx * 91 % 256, 128)).save(filename, quality=95)
+        filenames.append(filename)
+    return filenames
+
+
+def make_csv(filename: str, rows: int, images: list) -> None:
+    rnd = random.Random(rows)
+    with open(filename, 'w', encoding='UTF-8', newline='') as f:
+        f.write("name,surname,city,email,photo\n")
+        for idx in range(rows):
+            f.write("Name{0},Surname{1},City{2},user{0}@example.com,{3}\n".format(
+                idx, rnd.randint(0, 10 ** 6), rnd.randint(0, 100), rnd.choice(images)))
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KB on Linux; children - workers of process pool.
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--slides", type=int, default=3)
+    parser.add_argument("--images", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--mode", choices=("batch", "pipeline"), default="batch")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as dir_bench:
+        images = make_images(dir_bench, args.images)
+        filename_template = os.path.join(dir_bench, "template.pptx")
+        filename_csv = os.path.join(dir_bench, "input.csv")
+        make_template(filename_template, args.slides, images[0])
+        make_csv(filename_csv, args.rows, images)
+
+        converter = CsvToPptx(filename_csv, filename_template)
+        converter.dir_base = dir_bench
+        started = time.perf_counter()
+        if args.mode == "batch":
+            results = converter.batch_render(None, os.path.join(dir_bench, "output", "{number_row}.pptx"),
+                                             workers=args.workers)
+        else:
+            results = converter.pipeline(upload=False, dir_output=os.path.join(dir_bench, "output"))
+        seconds = time.perf_counter() - started
+
+    failed = sum(1 for result in results if result.error)
+    print("mode={0} rows={1} slides={2} workers={3}".format(args.mode, args.rows, args.slides, args.workers))
+    print("rows/sec: {0:.1f}  failed: {1}  seconds: {2:.2f}".format(len(results) / seconds, failed, seconds))
+    print("peak RSS: {0:.1f} MB".format(peak_rss_mb()))
+    report = converter.metrics.report()
+    for name, (calls, total) in sorted(report["timings"].items()):
+        print("  {0:<16} calls={1:<8} seconds={2:.3f}".format(name, calls, total))
+    for name, value in sorted(report["counters"].items()):
+        print("  {0:<16} {1}".format(name, value))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark of Human.objects.search() on synthetic humans.
+
+    DJANGO_SETTINGS_MODULE=project.settings python benchmarks/bench_human_search.py --humans 1000000
+
+Needs a Django project with this app installed and migrated. Humans are
+added (bulk_create) only up to --humans, so later runs reuse them. Prints
+median and worst milliseconds of each query.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+import django
+
+
+QUERIES = {
+    "surname prefix": lambda data: dict(surname=data["surname"][:5]),
+    "email": lambda data: dict(email=data["email"]),
+    "phone": lambda data: dict(phone=data["phone"]),
+    "token": lambda data: dict(token=data["token"]),
+    "city + level": lambda data: dict(city=data["city"], level_english=data["level"]),
+    "city + level + skill": lambda data: dict(city=data["city"], level_english=data["level"],
+                                              skills=[data["skill"]]),
+    "name text": lambda data: dict(text=data["surname"][:6]),
+}
+
+
+def seed(humans: int, batch_size: int = 5000) -> None:
+    from humans.models import (Human, Gender, City, Country, TimeZoneResidence,
+                               LevelLanguage, LevelLanguageTitle, LevelLanguageKnowledge, SkillProgramming)
+    if not City.objects.exists():
+        country = Country.objects.create(domen="ru", title="Russia")
+        timezone = TimeZoneResidence.objects.create(timezone="MSK", hours=3)
+        City.objects.bulk_create([City(title="City%d" % idx, country=country, timezone=timezone)
+                                  for idx in range(100)])
+        Gender.objects.bulk_create([Gender(gender="male"), Gender(gender="female")])
+        knowledge = LevelLanguageKnowledge.objects.create(title="INDEPENDENT")
+        for suffix in ("A1", "A2", "B1", "B2", "C1", "C2"):
+            LevelLanguage.objects.create(CEFR="CEFR", knowledge=knowledge,
+                                         level=LevelLanguageTitle.objects.create(suffix=suffix, title=suffix))
+        SkillProgramming.objects.bulk_create([SkillProgramming(title="Skill%d" % idx) for idx in range(50)])
+
+    cities = list(City.objects.values_list("id", flat=True))
+    levels = list(LevelLanguage.objects.values_list("id", flat=True))
+    genders = list(Gender.objects.values_list("id", flat=True))
+    skills = list(SkillProgramming.objects.values_list("id", flat=True))
+    through = Human.skills_programming.through
+    rnd = random.Random(humans)
+    count = Human.objects.count()
+    while count < humans:
+        batch = [Human(surname="Surname%07d" % rnd.randint(0, 10 ** 7), name="Name%d" % rnd.randint(0, 1000),
+                       email="user%d@example.com" % (count + idx), phone="+7999%07d" % (count + idx),
+                       gender_id=rnd.choice(genders), city_id=rnd.choice(cities), level_english_id=rnd.choice(levels))
+                 for idx in range(min(batch_size, humans - count))]
+        Human.objects.bulk_create(batch)
+        ids = Human.objects.order_by("-id").values_list("id", flat=True)[:len(batch)]
+        through.objects.bulk_create([through(human_id=pk, skillprogramming_id=skill)
+                                     for pk in ids for skill in rnd.sample(skills, 3)])
+        count += len(batch)
+        print("seeded", count, file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--humans", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.getcwd())
+    django.setup()
+    from django.db import connection
+    from humans.models import Human
+
+    seed(args.humans)
+    samples = list(Human.objects.order_by("?").values("surname", "email", "phone", "token",
+                                                      "city", "level_english")[:args.repeat])
+    through = Human.skills_programming.through
+    print("database={0} humans={1}".format(connection.vendor, Human.objects.count()))
+    for title, make_filters in QUERIES.items():
+        timings = []
+        for data in samples:
+            data = dict(data, level=data["level_english"],
+                        skill=through.objects.filter(human__email=data["email"])
+                        .values_list("skillprogramming_id", flat=True).first())
+            started = time.perf_counter()
+            list(Human.objects.search(**make_filters(data))[:50])
+            timings.append((time.perf_counter() - started) * 1000)
+        print("  {0:<22} median={1:7.2f} ms  max={2:7.2f} ms".format(
+            title, statistics.median(timings), max(timings)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Benchmark of token lookups of Human: database only and through token_cache.
+
+    DJANGO_SETTINGS_MODULE=project.settings python benchmarks/bench_human_token.py --humans 1000000
+
+Needs a Django project with this app installed and migrated; humans are
+seeded like in bench_human_search.py. Prints lookups per second.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+import django
+
+from bench_human_search import seed
+
+
+def lookups_per_second(lookup, tokens: list) -> float:
+    started = time.perf_counter()
+    for token in tokens:
+        lookup(token)
+    return len(tokens) / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--humans", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--active", type=int, default=1000, help="Distinct tokens used by lookups.")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.getcwd())
+    django.setup()
+    from django.db import connection
+    from humans.models import Human
+    from humans.human_token import get_human_by_token, token_cache
+
+    seed(args.humans)
+    rnd = random.Random(args.lookups)
+    active = list(Human.objects.order_by("?").values_list("token", flat=True)[:args.active])
+    tokens = [rnd.choice(active) for _ in range(args.lookups)]
+    unknown = ["0" * 40] * args.lookups
+
+    print("database={0} humans={1} active tokens={2}".format(connection.vendor, Human.objects.count(), len(active)))
+    print("  database only      {0:10.0f} lookups/sec".format(
+        lookups_per_second(lambda token: Human.objects.filter(token=token).first(), tokens)))
+    token_cache.clear()
+    print("  token_cache        {0:10.0f} lookups/sec".format(lookups_per_second(get_human_by_token, tokens)))
+    print("  unknown token      {0:10.0f} lookups/sec".format(lookups_per_second(get_human_by_token, unknown)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark of startup of CsvToPptx: import time (python -X importtime) and
+time to first useful work of short-lived processes.
+
+    python benchmarks/bench_startup.py --repeat 5
+
+"lazy" is import of CsvToPptx as it is; "eager" also imports the heavy
+modules (python-pptx, PIL, requests, pysftp, lxml) the way CsvToPptx did
+before they were deferred to the methods which need them.
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+DIR_PACKAGE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DIR_PACKAGE)
+
+HEAVY_IMPORTS = "import pptx, PIL.Image, requests, pysftp, lxml.etree; "
+
+# "import time: self | cumulative | name", nested imports have more spaces before name.
+IMPORT_TIME = re.compile(r"import time:\s+\d+ \|\s+(\d+) \|( +)\S+")
+
+
+def import_time_us(code: str) -> int:
+    """
+    :return: microseconds of all imports of code, from -X importtime
+    """
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=DIR_PACKAGE,
+                             capture_output=True, text=True, check=True)
+    return sum(int(match.group(1)) for match in IMPORT_TIME.finditer(process.stderr)
+               if match.group(2) == " ")
+
+
+def wall_time_ms(args: list) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable] + args, cwd=DIR_PACKAGE, capture_output=True, check=True)
+    return (time.perf_counter() - started) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    from bench_csvtopptx import make_template, make_images, make_csv
+
+    with tempfile.TemporaryDirectory() as dir_bench:
+        images = make_images(dir_bench, 1)
+        filename_template = os.path.join(dir_bench, "template.pptx")
+        filename_csv = os.path.join(dir_bench, "input.csv")
+        make_template(filename_template, 3, images[0])
+        make_csv(filename_csv, 10, images)
+        constructor = ("from CsvToPptx import CsvToPptx; converter = CsvToPptx({0!r}, {1!r}); "
+                       "converter.csv_extract_row(1)".format(filename_csv, filename_template))
+
+        cases = [
+            ("import, lazy", lambda: import_time_us("import CsvToPptx") / 1000),
+            ("import, eager", lambda: import_time_us(HEAVY_IMPORTS + "import CsvToPptx") / 1000),
+            ("CSV-only process, lazy", lambda: wall_time_ms(["-c", constructor])),
+            # Template parsed in constructor, as before it became lazy.
+            ("CSV-only process, eager", lambda: wall_time_ms(["-c", HEAVY_IMPORTS + constructor +
+                                                              "; converter.pptx_template"])),
+            ("CLI extract --csv", lambda: wall_time_ms(["CsvToPptx.py", "extract", "--csv", filename_csv])),
+            ("python -c pass", lambda: wall_time_ms(["-c", "pass"])),
+        ]
+        for title, measure in cases:
+            timings = [measure() for _ in range(args.repeat)]
+            print("  {0:<26} median={1:8.1f} ms  min={2:8.1f} ms".format(
+                title, statistics.median(timings), min(timings)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import csv
+from django.http import StreamingHttpResponse
+from .human_import import HUMAN_CSV_COLUMNS, HUMAN_CSV_ID_COLUMNS, SKILLS_SEPARATOR, CSV_DELIMITER, CSV_QUOTECHAR
+
+
+# Columns of export: id and columns of import, so export can be imported back;
+# ids of reference rows keep rows with the same title apart.
+HUMAN_EXPORT_COLUMNS = ("id",) + HUMAN_CSV_COLUMNS + tuple(HUMAN_CSV_ID_COLUMNS.values())
+
+
+def human_row(human) -> dict:
+    """
+    :param human: with related rows, see Human.objects.with_references()
+    :return: name of column -> text, see HUMAN_EXPORT_COLUMNS
+    """
+    level = human.level_english.level if human.level_english else None
+    return {
+        "id": str(human.id),
+        "nickname": human.nickname,
+        "phone": str(human.phone or ""),
+        "email": human.email,
+        "surname": human.surname,
+        "name": human.name,
+        "middle_name": human.middle_name,
+        "gender": human.gender.gender if human.gender else "",
+        "city": human.city.title if human.city else "",
+        "level_english": (level.suffix or level.title) if level else "",
+        "skills_programming": SKILLS_SEPARATOR.join(skill.title for skill in human.skills_programming.all()),
+        "gender_id": str(human.gender_id or ""),
+        "city_id": str(human.city_id or ""),
+        "level_english_id": str(human.level_english_id or ""),
+    }
+
+
+def iter_human_rows(humans, chunk_size: int = 2000):
+    """
+    Rows for CsvToPptx.batch_render(rows=...) and pipeline(rows=...):
+    humans are read chunk by chunk, memory doesn't depend on their number.
+    :param humans: queryset of Human
+    :param chunk_size: humans (and their skills) read at once
+    :return: generator of (number_row, dict), number_row from 1 as in CSV with header
+    """
+    queryset = humans.with_references().order_by("pk")
+    for number_row, human in enumerate(queryset.iterator(chunk_size=chunk_size), start=1):
+        yield number_row, human_row(human)
+
+
+class _Line:
+    """
+    File for csv.writer which returns written line instead of storing it.
+    """
+
+    def write(self, line: str) -> str:
+        return line
+
+
+def iter_csv_lines(humans, chunk_size: int = 2000):
+    """
+    :param humans: queryset of Human
+    :return: generator of lines of CSV-file with header
+    """
+    writer = csv.writer(_Line(), delimiter=CSV_DELIMITER, quotechar=CSV_QUOTECHAR)
+    yield writer.writerow(HUMAN_EXPORT_COLUMNS)
+    for _, row in iter_human_rows(humans, chunk_size):
+        yield writer.writerow([row[column] for column in HUMAN_EXPORT_COLUMNS])
+
+
+def write_csv(humans, filename: str, chunk_size: int = 2000) -> int:
+    """
+    :param humans: queryset of Human
+    :param filename: CSV-file for CsvToPptx
+    :return: number of humans
+    """
+    count = -1
+    with open(filename, 'w', encoding='UTF-8', newline='') as f:
+        for count, line in enumerate(iter_csv_lines(humans, chunk_size)):
+            f.write(line)
+    return count
+
+
+def csv_response(humans, filename: str = "humans.csv", chunk_size: int = 2000) -> StreamingHttpResponse:
+    """
+    :param humans: queryset of Human
+    :param filename: name of file for browser
+    :return: response which writes CSV while humans are read
+    """
+    response = StreamingHttpResponse(iter_csv_lines(humans, chunk_size), content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = 'attachment; filename="{0}"'.format(filename)
+    return response
+
+
+def render_decks(humans, converter, filename_pattern: str = "output/{id}.pptx",
+                 chunk_size: int = 2000, **kwargs) -> list():
+    """
+    One deck per human straight from queryset, without CSV-file.
+    :param humans: queryset of Human
+    :param converter: CsvToPptx with template, {{column}} are HUMAN_EXPORT_COLUMNS
+    :param filename_pattern: see CsvToPptx.batch_render()
+    :param kwargs: other arguments of CsvToPptx.batch_render(), e.g. workers, manifest
+    :return: list of BatchResult
+    """
+    return converter.batch_render(None, filename_pattern, rows=iter_human_rows(humans, chunk_size), **kwargs)
@@ -0,0 +1,193 @@
+import csv
+import datetime
+from django.db import transaction, DatabaseError
+from .models import Human, generate_token
+from . import reference_cache
+from .human_profile import refresh_profiles
+
+
+# Columns of CSV-file: fields of Human, gender/city/level_english/skills_programming
+# are titles of reference rows, skills are separated by SKILLS_SEPARATOR.
+HUMAN_CSV_COLUMNS = ("nickname", "phone", "email", "surname", "name", "middle_name",
+                     "gender", "city", "level_english", "skills_programming")
+SKILLS_SEPARATOR = ";"
+
+# Optional columns with id of reference row: title may be not unique (same city
+# in two countries), id is. Export writes them, import prefers them to title.
+HUMAN_CSV_ID_COLUMNS = {"gender": "gender_id", "city": "city_id", "level_english": "level_english_id"}
+
+# CSV dialect of import and export (human_export), same as CsvToPptx.set_csv_filename_input().
+CSV_DELIMITER = ','
+CSV_QUOTECHAR = '|'
+
+# Fields of existing Human replaced by upsert.
+HUMAN_FIELDS_UPDATE = ("nickname", "phone", "email", "surname", "name", "middle_name",
+                       "gender", "city", "level_english")
+
+
+class HumanImporter:
+    """
+    Import of Human from big CSV-file: streaming read, foreign keys from
+    reference_cache, bulk_create in batches, skills through M2M table in bulk.
+    Upsert mode updates humans with the same email (or phone).
+    """
+
+    def __init__(self,
+                 batch_size: int = 1000,
+                 upsert: bool = False,
+                 upsert_key: str = "email",
+                 delimiter: str = CSV_DELIMITER,
+                 quotechar: str = CSV_QUOTECHAR):
+        """
+        :param batch_size: humans in one INSERT and one transaction
+        :param upsert: update existing humans instead of creating duplicates
+        :param upsert_key: "email" or "phone"
+        :param delimiter: same as csv.reader
+        :param quotechar: same as csv.reader
+        """
+        self.batch_size = batch_size
+        self.upsert = upsert
+        self.upsert_key = upsert_key
+        self.delimiter = delimiter
+        self.quotechar = quotechar
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+
+    def import_file(self, filename: str, encoding: str = "UTF-8") -> dict():
+        """
+        :param filename: CSV-file with header, see HUMAN_CSV_COLUMNS
+        :return: dict: created, updated, errors - list of (number of line, text)
+        """
+        with open(filename, 'r', encoding=encoding, newline='') as csvfile:
+            return self.import_rows(csv.DictReader(csvfile, delimiter=self.delimiter, quotechar=self.quotechar))
+
+    def import_rows(self, rows) -> dict():
+        """
+        :param rows: iterable of dict: column -> value
+        :return: dict: created, updated, errors - list of (number of line, text)
+        """
+        batch = []
+        for number_row, row in enumerate(rows, start=2):
+            human = self.build_human(number_row, row)
+            if human is not None:
+                batch.append((number_row,) + human)
+            if len(batch) >= self.batch_size:
+                self.save_batch(batch)
+                batch = []
+        if batch:
+            self.save_batch(batch)
+        return {"created": self.created, "updated": self.updated, "errors": self.errors}
+
+    def build_human(self, number_row: int, row: dict):
+        """
+        :return: (Human, list of SkillProgramming) or None if row has errors
+        """
+        values = {name: (row.get(name) or "").strip() for name in HUMAN_CSV_COLUMNS}
+        errors = []
+        references = {}
+        for name, cache in (("gender", reference_cache.genders), ("city", reference_cache.cities),
+                            ("level_english", reference_cache.levels)):
+            pk = (row.get(HUMAN_CSV_ID_COLUMNS[name]) or "").strip()
+            if pk:
+                # Id of other database must not silently point to other row: title must match.
+                references[name] = cache.get(pk) if pk.isdigit() else None
+                if references[name] is None or (values[name]
+                                                and not cache.has_title(references[name], values[name])):
+                    errors.append("unknown {0}: {1} (id {2})".format(name, values[name], pk))
+                continue
+            references[name] = cache.get_by_title(values[name]) if values[name] else None
+            if values[name] and references[name] is None:
+                errors.append("unknown {0}: {1}".format(name, values[name]))
+        skills = []
+        for title in filter(None, (title.strip() for title in values["skills_programming"].split(SKILLS_SEPARATOR))):
+            skill = reference_cache.skills.get_by_title(title)
+            if skill is None:
+                errors.append("unknown skill: {0}".format(title))
+            else:
+                skills.append(skill)
+        if not values["surname"] or not values["name"]:
+            errors.append("surname and name are required")
+        for name in HUMAN_CSV_COLUMNS:
+            # Too long value fails INSERT of whole batch (DataError on PostgreSQL).
+            field = Human._meta.get_field(name)
+            if not field.is_relation and field.max_length and len(values[name]) > field.max_length:
+                errors.append("{0} is longer than {1}".format(name, field.max_length))
+        if errors:
+            self.errors.append((number_row, "; ".join(errors)))
+            return None
+
+        human = Human(nickname=values["nickname"], phone=values["phone"], email=values["email"],
+                      surname=values["surname"], name=values["name"], middle_name=values["middle_name"],
+                      token=generate_token(), **references)
+        return human, skills
+
+    def key(self, human: Human) -> str:
+        """
+        :return: value of upsert_key as text, "" if empty
+        """
+        value = getattr(human, self.upsert_key)
+        return str(value) if value else ""
+
+    def save_batch(self, batch: list) -> None:
+        """
+        Save batch in one transaction. If database rejects it, batch is rolled back
+        and saved row by row: only bad rows go to errors.
+        :param batch: list of (number of line, Human, list of SkillProgramming)
+        """
+        try:
+            self.save_rows(batch)
+        except DatabaseError as e:
+            if len(batch) == 1:
+                self.errors.append((batch[0][0], "{0}: {1}".format(type(e).__name__, e)))
+                return
+            for number_row, human, skills in batch:
+                # Primary key may be left by rolled back INSERT.
+                human.pk, human._state.adding = None, True
+                self.save_batch([(number_row, human, skills)])
+
+    def save_rows(self, batch: list) -> None:
+        through = Human.skills_programming.through
+        batch = [(human, skills) for _, human, skills in batch]
+        with transaction.atomic():
+            existing = {}
+            if self.upsert:
+                # Same key twice in one batch: the last row wins.
+                batch = list({self.key(human) or id(human): (human, skills) for human, skills in batch}.values())
+                keys = [self.key(human) for human, _ in batch if self.key(human)]
+                existing = {self.key(human): human
+                            for human in Human.objects.filter(**{self.upsert_key + "__in": keys})}
+
+            to_create, to_update = [], []
+            for human, skills in batch:
+                old = existing.get(self.key(human)) if self.upsert and self.key(human) else None
+                if old is None:
+                    to_create.append((human, skills))
+                    continue
+                for field in HUMAN_FIELDS_UPDATE:
+                    setattr(old, field, getattr(human, field))
+                old.modified_at = datetime.date.today()
+                to_update.append((old, skills))
+
+            Human.objects.bulk_create([human for human, _ in to_create], batch_size=self.batch_size)
+            if to_create and to_create[0][0].pk is None:
+                # Backend doesn't return primary keys of bulk_create, tokens are unique.
+                ids = dict(Human.objects.filter(token__in=[human.token for human, _ in to_create])
+                           .values_list("token", "id"))
+                for human, _ in to_create:
+                    human.pk = ids[human.token]
+            if to_update:
+                Human.objects.bulk_update([human for human, _ in to_update],
+                                          HUMAN_FIELDS_UPDATE + ("modified_at",),
+                                          batch_size=self.batch_size)
+                through.objects.filter(human_id__in=[human.pk for human, _ in to_update]).delete()
+
+            through.objects.bulk_create(
+                [through(human_id=human.pk, skillprogramming_id=skill.pk)
+                 for human, skills in to_create + to_update for skill in skills],
+                batch_size=self.batch_size, ignore_conflicts=True)
+            # bulk_create/bulk_update don't send signals which keep profiles up to date.
+            refresh_profiles(Human.objects.filter(pk__in=[human.pk for human, _ in to_create + to_update]),
+                             chunk_size=self.batch_size)
+        self.created += len(to_create)
+        self.updated += len(to_update)
@@ -0,0 +1,112 @@
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from .models import (Human, HumanProfile, Gender, City, Country, TimeZoneResidence, LevelLanguage,
+                     LevelLanguageTitle, LevelLanguageKnowledge, SkillProgramming)
+
+
+# Fields of HumanProfile.data updated by refresh_profiles().
+HUMAN_PROFILE_UPDATE = ("human_created_at", "data", "modified_at")
+
+
+def profile_data(human: Human) -> dict:
+    """
+    :param human: with related rows, see Human.objects.with_related() or with_references()
+    :return: card of human, JSON-compatible
+    """
+    city = human.city
+    return {
+        'id': human.id,
+        'nickname': human.nickname,
+        'phone': str(human.phone),
+        'email': human.email,
+        'surname': human.surname,
+        'name': human.name,
+        'middle_name': human.middle_name,
+        'gender': str(human.gender) if human.gender else None,
+        'city': str(city) if city else None,
+        'country': str(city.country) if city and city.country else None,
+        'timezone': str(city.timezone) if city and city.timezone else None,
+        'level_english': str(human.level_english) if human.level_english else None,
+        'skills_programming': [str(skill) for skill in human.skills_programming.all()],
+        'created_at': human.created_at.isoformat(),
+    }
+
+
+def refresh_profiles(humans, chunk_size: int = 1000) -> int:
+    """
+    Build profiles again, one upsert per chunk.
+    :param humans: queryset of Human
+    :param chunk_size: humans read and written at once
+    :return: number of profiles
+    """
+    count = 0
+    profiles = []
+    for human in humans.with_related().order_by("pk").iterator(chunk_size=chunk_size):
+        profiles.append(HumanProfile(human=human, human_created_at=human.created_at, data=profile_data(human)))
+        if len(profiles) >= chunk_size:
+            count += _save_profiles(profiles)
+            profiles = []
+    if profiles:
+        count += _save_profiles(profiles)
+    return count
+
+
+def _save_profiles(profiles: list) -> int:
+    HumanProfile.objects.bulk_create(profiles, update_conflicts=True, unique_fields=["human"],
+                                     update_fields=HUMAN_PROFILE_UPDATE)
+    return len(profiles)
+
+
+# SIGNALS
+
+# Reference model -> lookup from Human to it.
+HUMANS_OF_REFERENCE = {
+    Gender: "gender",
+    City: "city",
+    Country: "city__country",
+    TimeZoneResidence: "city__timezone",
+    LevelLanguage: "level_english",
+    LevelLanguageTitle: "level_english__level",
+    LevelLanguageKnowledge: "level_english__knowledge",
+    SkillProgramming: "skills_programming",
+}
+
+
+def on_human_saved(sender, instance, raw=False, **kwargs) -> None:
+    if not raw:
+        refresh_profiles(Human.objects.filter(pk=instance.pk))
+
+
+def on_skills_changed(sender, instance, action, reverse, model, pk_set, **kwargs) -> None:
+    if action not in ("post_add", "post_remove", "post_clear", "pre_clear"):
+        return
+    if not reverse:
+        if action != "pre_clear":
+            refresh_profiles(Human.objects.filter(pk=instance.pk))
+    elif action == "pre_clear":
+        # skill.humans.clear(): humans are unknown after it.
+        instance._profile_humans = list(instance.humans.values_list("pk", flat=True))
+    else:
+        pks = pk_set if action != "post_clear" else getattr(instance, "_profile_humans", [])
+        refresh_profiles(Human.objects.filter(pk__in=pks))
+
+
+def on_reference_saved(sender, instance, raw=False, **kwargs) -> None:
+    if not raw:
+        refresh_profiles(Human.objects.filter(**{HUMANS_OF_REFERENCE[sender]: instance}).distinct())
+
+
+def on_skill_deleting(sender, instance, **kwargs) -> None:
+    # Rows of M2M are deleted without m2m_changed: remember humans before.
+    instance._profile_humans = list(instance.humans.values_list("pk", flat=True))
+
+
+def on_skill_deleted(sender, instance, **kwargs) -> None:
+    refresh_profiles(Human.objects.filter(pk__in=getattr(instance, "_profile_humans", [])))
+
+
+post_save.connect(on_human_saved, sender=Human, dispatch_uid="human_profile")
+m2m_changed.connect(on_skills_changed, sender=Human.skills_programming.through, dispatch_uid="human_profile")
+for reference in HUMANS_OF_REFERENCE:
+    post_save.connect(on_reference_saved, sender=reference, dispatch_uid="human_profile")
+pre_delete.connect(on_skill_deleting, sender=SkillProgramming, dispatch_uid="human_profile")
+post_delete.connect(on_skill_deleted, sender=SkillProgramming, dispatch_uid="human_profile")
@@ -0,0 +1,179 @@
+import time
+import threading
+from collections import OrderedDict
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from rest_framework import authentication, exceptions
+from .models import Human, generate_token
+
+
+class TokenCache:
+    """
+    Small LRU of token -> Human (or None, if token is unknown) with time to live.
+    Version of cache is in Django cache: invalidate() increments it when humans
+    are changed, every process clears its cache when it sees new version,
+    at most check_interval seconds later.
+    """
+
+    def __init__(self,
+                 ttl: float = 60.0,
+                 max_size: int = 10000,
+                 check_interval: float = 1.0):
+        """
+        :param ttl: seconds while result of lookup is used
+        :param max_size: tokens in cache
+        :param check_interval: seconds between reads of version from Django cache
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.check_interval = check_interval
+        self.key = "human_token:version"
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.version_loaded = None
+        self.checked_at = 0.0
+
+    def version(self):
+        return cache.get(self.key, 0)
+
+    def invalidate(self) -> None:
+        try:
+            cache.incr(self.key)
+        except ValueError:
+            # Key is not in cache (new or evicted): any value unlike old ones.
+            cache.set(self.key, time.time_ns(), None)
+        self.checked_at = 0.0
+
+    def refresh(self):
+        """
+        Clear cache if its version was changed, at most once per check_interval.
+        :return: version of items in cache
+        """
+        now = time.monotonic()
+        if self.version_loaded is not None and now - self.checked_at < self.check_interval:
+            return self.version_loaded
+        version = self.version()
+        with self.lock:
+            if version != self.version_loaded:
+                self.items.clear()
+                self.version_loaded = version
+            self.checked_at = now
+        return version
+
+    def get(self, token: str):
+        """
+        :return: (True, Human or None) if token is in cache, else (False, None)
+        """
+        self.refresh()
+        with self.lock:
+            item = self.items.get(token)
+            if item is None:
+                return False, None
+            expires, human = item
+            if expires < time.monotonic():
+                del self.items[token]
+                return False, None
+            self.items.move_to_end(token)
+            return True, human
+
+    def set(self, token: str, human, version=None) -> None:
+        """
+        :param version: refresh() before human was read, None - current: human read
+                        before invalidate() is not stored under new version
+        """
+        with self.lock:
+            if version is not None and version != self.version_loaded:
+                return
+            self.items[token] = (time.monotonic() + self.ttl, human)
+            self.items.move_to_end(token)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+    def discard(self, tokens) -> None:
+        with self.lock:
+            for token in tokens:
+                self.items.pop(token, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.items.clear()
+
+
+token_cache = TokenCache()
+
+
+def get_human_by_token(token: str):
+    """
+    :param token: Human.token
+    :return: Human or None, from token_cache or one indexed query
+    """
+    if not token:
+        return None
+    found, human = token_cache.get(token)
+    if not found:
+        version = token_cache.version_loaded
+        human = Human.objects.filter(token=token).first()
+        token_cache.set(token, human, version)
+    return human
+
+
+def rotate_tokens(queryset, batch_size: int = 1000) -> int:
+    """
+    New tokens for many humans: one UPDATE per batch. Old tokens stop working
+    after commit of batch, in other processes within token_cache.check_interval.
+    :param queryset: humans, e.g. Human.objects.filter(city=city)
+    :param batch_size: humans in one UPDATE
+    :return: number of humans
+    """
+    count = 0
+    pks = list(queryset.values_list("pk", flat=True))
+    for start in range(0, len(pks), batch_size):
+        with transaction.atomic():
+            humans = list(Human.objects.filter(pk__in=pks[start:start + batch_size]).only("pk", "token"))
+            old = [human.token for human in humans]
+            for human in humans:
+                human.token = generate_token()
+            Human.objects.bulk_update(humans, ["token"])
+            transaction.on_commit(token_cache.invalidate)
+        token_cache.discard(old)
+        count += len(humans)
+    return count
+
+
+class HumanTokenAuthentication(authentication.BaseAuthentication):
+    """
+    DRF authentication by Human.token: header "Authorization: Human <token>".
+    request.user is Human.
+    """
+    keyword = "Human"
+
+    def authenticate(self, request):
+        parts = authentication.get_authorization_header(request).split()
+        if not parts or parts[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(parts) != 2:
+            raise exceptions.AuthenticationFailed("Invalid token header.")
+        try:
+            token = parts[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed("Invalid token header.")
+        human = get_human_by_token(token)
+        if human is None:
+            raise exceptions.AuthenticationFailed("Invalid token.")
+        return human, token
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+# SIGNALS
+
+def invalidate_token_cache(sender, instance, using=None, **kwargs) -> None:
+    # Changed or deleted human must not be request.user by old row.
+    token_cache.discard([instance.token])
+    transaction.on_commit(token_cache.invalidate, using=using)
+
+
+post_save.connect(invalidate_token_cache, sender=Human, dispatch_uid="human_token")
+post_delete.connect(invalidate_token_cache, sender=Human, dispatch_uid="human_token")
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import connections, DEFAULT_DB_ALIAS
+from ...models import Human
+
+
+class Command(BaseCommand):
+    """
+    python manage.py create_search_indexes
+    Trigram indexes for Human.objects.search(text=...), PostgreSQL only.
+    """
+    help = "Create pg_trgm GIN indexes on surname and name of Human (PostgreSQL)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if connection.vendor != "postgresql":
+            self.stdout.write("Database is {0}: search uses icontains, nothing to create.".format(connection.vendor))
+            return
+        table = Human._meta.db_table
+        # CONCURRENTLY can't be inside transaction: one statement per execute, autocommit.
+        statements = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"]
+        for field in ("surname", "name"):
+            statements.append(
+                'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{0}_{1}_trgm" ON "{0}" USING gin ("{1}" gin_trgm_ops)'
+                .format(table, field))
+        with connection.cursor() as cursor:
+            for sql in statements:
+                self.stdout.write(sql)
+                cursor.execute(sql)
+        self.stdout.write(self.style.SUCCESS("Done."))
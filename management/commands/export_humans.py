@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from ...models import Human
+from ...human_export import write_csv
+
+
+class Command(BaseCommand):
+    """
+    python manage.py export_humans input.csv --chunk-size 5000
+    """
+    help = "Export all humans into CSV-file in the layout of CsvToPptx."
+
+    def add_arguments(self, parser):
+        parser.add_argument("filename", help="CSV-file")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Humans read at once.")
+
+    def handle(self, *args, **options):
+        count = write_csv(Human.objects.all(), options["filename"], chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS("Humans: {0}".format(count)))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from ...human_import import HumanImporter, HUMAN_CSV_COLUMNS, HUMAN_CSV_ID_COLUMNS, CSV_DELIMITER, CSV_QUOTECHAR
+
+
+class Command(BaseCommand):
+    """
+    python manage.py import_humans candidates.csv --batch-size 2000 --upsert email
+    """
+    help = "Import Human from CSV-file with header: {0} (optional: {1}).".format(
+        ", ".join(HUMAN_CSV_COLUMNS), ", ".join(HUMAN_CSV_ID_COLUMNS.values()))
+
+    def add_arguments(self, parser):
+        parser.add_argument("filename", help="CSV-file")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Humans in one INSERT.")
+        parser.add_argument("--upsert", choices=("email", "phone"), default=None,
+                            help="Update existing humans with same email/phone.")
+        parser.add_argument("--delimiter", default=CSV_DELIMITER)
+        parser.add_argument("--quotechar", default=CSV_QUOTECHAR,
+                            help="Default is the one of export_humans, '\"' for most other files.")
+        parser.add_argument("--encoding", default="UTF-8")
+
+    def handle(self, *args, **options):
+        importer = HumanImporter(batch_size=options["batch_size"],
+                                 upsert=options["upsert"] is not None,
+                                 upsert_key=options["upsert"] or "email",
+                                 delimiter=options["delimiter"],
+                                 quotechar=options["quotechar"])
+        result = importer.import_file(options["filename"], encoding=options["encoding"])
+        for number_row, error in result["errors"]:
+            self.stderr.write("line {0}: {1}".format(number_row, error))
+        self.stdout.write(self.style.SUCCESS("Created: {0}, updated: {1}, errors: {2}".format(
+            result["created"], result["updated"], len(result["errors"]))))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from ...models import TeamChat
+from ...wa_worker import WAGroupWorker
+
+
+class Command(BaseCommand):
+    """
+    python manage.py process_team_chats --failed --running
+    Create WhatsApp groups left pending (e.g. process was restarted before worker got them).
+    """
+    help = "Create WhatsApp groups of pending TeamChat."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--failed", action="store_true",
+                            help="Retry failed chats too. Check their error first: group may exist.")
+        parser.add_argument("--running", action="store_true",
+                            help="Retry chats left running by stopped process. Only when no worker is alive.")
+        parser.add_argument("--retries", type=int, default=3)
+
+    def handle(self, *args, **options):
+        statuses = [TeamChat.STATUS_FAILED] if options["failed"] else []
+        statuses += [TeamChat.STATUS_RUNNING] if options["running"] else []
+        if statuses:
+            TeamChat.objects.filter(status__in=statuses).update(status=TeamChat.STATUS_PENDING)
+        worker = WAGroupWorker(retries=options["retries"])
+        ids = list(TeamChat.objects.filter(status=TeamChat.STATUS_PENDING).values_list("id", flat=True))
+        created = sum(1 for chat_id in ids if worker.process(chat_id))
+        self.stdout.write(self.style.SUCCESS("Created: {0}, failed: {1}".format(created, len(ids) - created)))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from ...models import Human
+from ...human_profile import refresh_profiles
+
+
+class Command(BaseCommand):
+    """
+    python manage.py rebuild_human_profiles --chunk-size 2000 --missing
+    """
+    help = "Build HumanProfile of all humans (or of humans without it), chunk by chunk."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Humans in one read and one upsert.")
+        parser.add_argument("--missing", action="store_true", help="Only humans without profile.")
+
+    def handle(self, *args, **options):
+        humans = Human.objects.all()
+        if options["missing"]:
+            humans = humans.filter(profile__isnull=True)
+        count = refresh_profiles(humans, chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS("Profiles: {0}".format(count)))
@@ -1,6 +1,16 @@
-from django.db import models
+from django.db import models, connections
 from phonenumber_field.modelfields import PhoneNumberField
 import binascii
+import base64
+import datetime
+import os
+
+
+def generate_token() -> str:
+    """
+    Token for Human: 40 hex chars.
+    """
+    return binascii.hexlify(os.urandom(20)).decode()
 
 
 class AbsModel(models.Model):
@@ -17,17 +27,159 @@ class AbsModel(models.Model):
         abstract = True
 
 
+class KeysetQuerySet(models.QuerySet):
+    """
+    Keyset pagination: WHERE (date, id) < cursor instead of OFFSET,
+    so every page costs the same.
+    """
+    # Fields of pages: newest first, second one (unique) breaks ties of the first.
+    PAGE_FIELDS = ("created_at", "id")
+
+    def encode_cursor(self, obj) -> str:
+        """
+        :return: cursor of page after obj
+        """
+        date_field, id_field = self.PAGE_FIELDS
+        text = "{0}|{1}".format(getattr(obj, date_field).isoformat(), getattr(obj, id_field))
+        return base64.urlsafe_b64encode(text.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple():
+        """
+        :return: (date, id)
+        :raise ValueError: cursor is broken
+        """
+        try:
+            created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+            return datetime.datetime.fromisoformat(created_at), int(pk)
+        except (TypeError, ValueError) as e:
+            raise ValueError("bad cursor: {0}".format(cursor)) from e
+
+    def after(self, cursor: str = None):
+        """
+        :param cursor: "next" of previous page, None - first page
+        :return: queryset of objects from cursor, newest first
+        """
+        date_field, id_field = self.PAGE_FIELDS
+        queryset = self.order_by("-" + date_field, "-" + id_field)
+        if not cursor:
+            return queryset
+        date, pk = self.decode_cursor(cursor)
+        # date <= cursor is redundant, but lets database start index range at cursor:
+        # with OR alone it walks index from the newest row.
+        return queryset.filter(models.Q(**{date_field + "__lte": date}),
+                               models.Q(**{date_field + "__lt": date}) |
+                               models.Q(**{date_field: date, id_field + "__lt": pk}))
+
+    def page(self, cursor: str = None, size: int = 50) -> tuple():
+        """
+        :param cursor: "next" of previous page, None - first page
+        :param size: objects on page
+        :return: (list of objects, cursor of next page or None)
+        """
+        objects = list(self.after(cursor)[:size + 1])
+        if len(objects) > size:
+            return objects[:size], self.encode_cursor(objects[size - 1])
+        return objects, None
+
+
+class ReferenceIterable(models.query.ModelIterable):
+    """
+    Human with gender, city and level_english from reference_cache, see HumanQuerySet.with_references().
+    """
+
+    def __iter__(self):
+        from .reference_cache import attach_references
+        for human in super().__iter__():
+            attach_references(human)
+            yield human
+
+
+class HumanQuerySet(KeysetQuerySet):
+    """
+    Reading of Human for lists: related rows in one query, keyset pagination.
+    """
+    def with_related(self):
+        """
+        Everything which __str__ of Human, City and LevelLanguage read:
+        foreign keys in one JOIN, skills in one more query.
+        """
+        return self.select_related("gender",
+                                   "city__country", "city__timezone",
+                                   "level_english__level", "level_english__knowledge"
+                                   ).prefetch_related("skills_programming")
+
+    def with_references(self):
+        """
+        Same rows as with_related(), but gender, city and level_english are taken
+        from reference_cache of process instead of JOIN: for lists and exports.
+        They may be up to check_interval old, use with_related() to write them.
+        """
+        queryset = self.prefetch_related("skills_programming")
+        queryset._iterable_class = ReferenceIterable
+        return queryset
+
+    def search(self,
+               text: str = None,
+               surname: str = None,
+               email: str = None,
+               phone: str = None,
+               token: str = None,
+               city=None,
+               level_english=None,
+               skills=()):
+        """
+        Filters which use indexes of Human. Empty arguments are ignored.
+        :param text: fuzzy search in surname and name: operator % of pg_trgm on
+                     PostgreSQL, which uses GIN indexes of command create_search_indexes
+                     (threshold is pg_trgm.similarity_threshold, 0.3 by default),
+                     icontains on others
+        :param surname: beginning of surname
+        :param email: whole e-mail
+        :param phone: whole phone
+        :param token: whole token
+        :param city: City or id
+        :param level_english: LevelLanguage or id
+        :param skills: SkillProgramming or ids, human must have all of them
+        :return: queryset, ordered by similarity if text on PostgreSQL
+        """
+        queryset = self
+        exact = {"surname__startswith": surname, "email": email, "phone": phone, "token": token,
+                 "city": city, "level_english": level_english}
+        queryset = queryset.filter(**{lookup: value for lookup, value in exact.items() if value})
+        through = self.model.skills_programming.through
+        for skill in skills or ():
+            # EXISTS per skill: no JOIN duplicates, no DISTINCT.
+            queryset = queryset.filter(models.Exists(through.objects.filter(
+                human_id=models.OuterRef("pk"), skillprogramming_id=getattr(skill, "pk", skill))))
+        if text:
+            if connections[queryset.db].vendor == "postgresql":
+                from django.contrib.postgres.lookups import TrigramSimilar
+                from django.contrib.postgres.search import TrigramSimilarity
+                # Filter by % (index scan), similarity only orders what was found:
+                # filter by similarity() itself can't use index and reads every row.
+                queryset = queryset.filter(
+                    models.Q(TrigramSimilar(models.F("surname"), models.Value(text))) |
+                    models.Q(TrigramSimilar(models.F("name"), models.Value(text)))
+                ).annotate(
+                    similarity=TrigramSimilarity("surname", text) + TrigramSimilarity("name", text)
+                ).order_by("-similarity", "-id")
+            else:
+                queryset = queryset.filter(models.Q(surname__icontains=text) | models.Q(name__icontains=text))
+        return queryset
+
+
 class Human(AbsModel):
     """
     Main models about human.
     """
     nickname = models.CharField(max_length=200, default="",
                                 blank=True, verbose_name="Nickname:", help_text="Псевдоним.")
-    phone = PhoneNumberField(default="",
+    phone = PhoneNumberField(default="", db_index=True,
                              blank=True, verbose_name="Phone:", help_text="Номер телефона.")
-    email = models.EmailField(max_length=200, default="",
+    email = models.EmailField(max_length=200, default="", db_index=True,
                               blank=True, verbose_name="E-mail:", help_text="E-mail главный.")
-    surname = models.CharField(max_length=200, default="",
+    surname = models.CharField(max_length=200, default="", db_index=True,
                                blank=False, verbose_name="Surname:", help_text="Фамилия.")
     name = models.CharField(max_length=200, default="",
                             blank=False, verbose_name="Name:", help_text="Имя.")
@@ -45,19 +197,33 @@ class Human(AbsModel):
     skills_programming = models.ManyToManyField('SkillProgramming',
                                                 related_name='humans', related_query_name='human',
                                                 blank=False, verbose_name="Skills:", help_text="Навыки.")
-    token = models.CharField(max_length=40, default="",
+    token = models.CharField(max_length=40, default=generate_token, unique=True,
                              blank=True, verbose_name="Token:", help_text="Токен.")
 
+    objects = HumanQuerySet.as_manager()
+
     def __str__(self):
         return "{0} {1} - {2}".format(self.surname, self.name, self.email)
 
+    @property
+    def is_authenticated(self):
+        """
+        Human as request.user of HumanTokenAuthentication.
+        """
+        return True
+
     class Meta:
         verbose_name = "Человек"
         verbose_name_plural = "Человеки"
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="human_page"),
+            models.Index(fields=["surname", "name"], name="human_surname_name"),
+            models.Index(fields=["city", "level_english"], name="human_city_level"),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.token:
-            self.token = binascii.hexlify(os.urandom(20)).decode()
+            self.token = generate_token()
         super().save(*args, **kwargs)
 
 ####################################################################################
@@ -230,3 +396,83 @@ class SkillProgramming(AbsModel):
     class Meta:
         verbose_name = "Дополнительный навык"
         verbose_name_plural = "Дополнительный навыки"
+
+
+####################################################################################
+
+
+class TeamChat(AbsModel):
+    """
+    WhatsApp group of Team, created in background by wa_worker.
+    """
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    CHOICE_STATUS = (
+        (STATUS_PENDING, 'Ждёт создания'),
+        (STATUS_RUNNING, 'Создаётся'),
+        (STATUS_DONE, 'Создан'),
+        (STATUS_FAILED, 'Ошибка'),
+    )
+    team = models.OneToOneField('events.Team', on_delete=models.CASCADE,
+                                related_name='chat', related_query_name='chat',
+                                blank=False, verbose_name="Team:", help_text="Команда.")
+    idempotency_key = models.CharField(max_length=64, unique=True,
+                                       blank=False, verbose_name="Idempotency key:", help_text="Ключ повтора запроса.")
+    phone = models.CharField(max_length=20, default="",
+                             blank=False, verbose_name="Phone:", help_text="Телефон капитана.")
+    chat_name = models.CharField(max_length=200, default="",
+                                 blank=False, verbose_name="Chat name:", help_text="Название группы.")
+    status = models.CharField(max_length=10, default=STATUS_PENDING, choices=CHOICE_STATUS, db_index=True,
+                              blank=False, verbose_name="Status:", help_text="Состояние.")
+    attempts = models.IntegerField(default=0,
+                                   blank=False, verbose_name="Attempts:", help_text="Попыток создания.")
+    error = models.TextField(default="",
+                             blank=True, verbose_name="Error:", help_text="Последняя ошибка.")
+
+    def __str__(self):
+        return "{0} - {1}".format(self.chat_name, self.status)
+
+    class Meta:
+        verbose_name = "Чат команды"
+        verbose_name_plural = "Чаты команд"
+
+
+####################################################################################
+
+
+class HumanProfileQuerySet(KeysetQuerySet):
+    PAGE_FIELDS = ("human_created_at", "human_id")
+
+
+class HumanProfile(AbsModel):
+    """
+    Denormalized card of Human: Human with all its related rows as JSON,
+    kept up to date by human_profile (signals). Lists read one table.
+    """
+    human = models.OneToOneField('Human', on_delete=models.CASCADE, primary_key=True,
+                                 related_name='profile', related_query_name='profile',
+                                 blank=False, verbose_name="Human:", help_text="Человек.")
+    human_created_at = models.DateTimeField(blank=False, verbose_name="Human created:",
+                                            help_text="Дата создания человека.")
+    data = models.JSONField(default=dict,
+                            blank=True, verbose_name="Data:", help_text="Карточка человека.")
+
+    objects = HumanProfileQuerySet.as_manager()
+
+    def __str__(self):
+        return "{0}".format(self.human_id)
+
+    class Meta:
+        verbose_name = "Карточка человека"
+        verbose_name_plural = "Карточки людей"
+        indexes = [
+            models.Index(fields=["-human_created_at", "-human"], name="human_profile_page"),
+        ]
+
+
+# Signals must be connected in every process which saves these models.
+from . import reference_cache  # noqa: E402,F401
+from . import human_profile  # noqa: E402,F401
+from . import human_token  # noqa: E402,F401
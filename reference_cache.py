@@ -0,0 +1,153 @@
+import time
+import threading
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from .models import (Gender, City, Country, TimeZoneResidence, LevelLanguage,
+                     LevelLanguageTitle, LevelLanguageKnowledge, SkillProgramming)
+
+
+class ReferenceCache:
+    """
+    All rows of small reference table in memory of process, by id and by title.
+    Version of table is in Django cache: post_save/post_delete increment it
+    after commit, other processes see new version and load table again.
+    """
+
+    def __init__(self,
+                 queryset,
+                 *titles,
+                 check_interval: float = 1.0):
+        """
+        :param queryset: e.g. City.objects.select_related("country", "timezone")
+        :param titles: callables(obj) -> text to find obj by
+        :param check_interval: seconds between reads of version from Django cache
+        """
+        self.queryset = queryset
+        self.titles = titles
+        self.check_interval = check_interval
+        self.key = "reference_cache:{0}".format(queryset.model._meta.label_lower)
+        self.lock = threading.Lock()
+        self.version_loaded = None
+        self.checked_at = 0.0
+        self.by_id = {}
+        self.by_title = {}
+
+    @staticmethod
+    def normalize(text) -> str:
+        return str(text).strip().lower()
+
+    def version(self):
+        return cache.get(self.key, 0)
+
+    def invalidate(self) -> None:
+        try:
+            cache.incr(self.key)
+        except ValueError:
+            # Key is not in cache (new or evicted): any value unlike old ones.
+            cache.set(self.key, time.time_ns(), None)
+        self.checked_at = 0.0
+
+    def load(self) -> None:
+        version = self.version()
+        by_id, by_title = {}, {}
+        for obj in self.queryset.all():
+            by_id[obj.pk] = obj
+            for title in self.titles:
+                text = title(obj)
+                if text:
+                    by_title.setdefault(self.normalize(text), obj)
+        self.by_id, self.by_title = by_id, by_title
+        self.version_loaded = version
+
+    def refresh(self) -> None:
+        """
+        Load table again if its version was changed, at most once per check_interval.
+        """
+        now = time.monotonic()
+        if self.version_loaded is not None and now - self.checked_at < self.check_interval:
+            return
+        with self.lock:
+            if self.version_loaded is None or self.version() != self.version_loaded:
+                self.load()
+            self.checked_at = now
+
+    def get(self, pk):
+        """
+        :return: object or None
+        """
+        self.refresh()
+        return self.by_id.get(int(pk)) if pk is not None else None
+
+    def get_by_title(self, text):
+        """
+        :return: object or None, text is compared without case and spaces around
+        """
+        self.refresh()
+        return self.by_title.get(self.normalize(text))
+
+    def has_title(self, obj, text) -> bool:
+        """
+        :return: True if get_by_title() could find obj by text, if it was the only one with it
+        """
+        text = self.normalize(text)
+        return any(title(obj) and self.normalize(title(obj)) == text for title in self.titles)
+
+    def all(self) -> list():
+        self.refresh()
+        return list(self.by_id.values())
+
+
+genders = ReferenceCache(Gender.objects.all(), lambda obj: obj.gender)
+countries = ReferenceCache(Country.objects.all(), lambda obj: obj.title, lambda obj: obj.domen)
+timezones = ReferenceCache(TimeZoneResidence.objects.all(), lambda obj: obj.timezone)
+cities = ReferenceCache(City.objects.select_related("country", "timezone"), lambda obj: obj.title)
+level_titles = ReferenceCache(LevelLanguageTitle.objects.all(), lambda obj: obj.suffix, lambda obj: obj.title)
+level_knowledges = ReferenceCache(LevelLanguageKnowledge.objects.all(), lambda obj: obj.title)
+levels = ReferenceCache(LevelLanguage.objects.select_related("level", "knowledge"),
+                        lambda obj: obj.level and obj.level.suffix,
+                        lambda obj: obj.level and obj.level.title)
+skills = ReferenceCache(SkillProgramming.objects.all(), lambda obj: obj.title)
+
+# Model -> caches to invalidate when its row changes: own and ones which hold its rows.
+REFERENCE_CACHES = {
+    Gender: (genders,),
+    Country: (countries, cities),
+    TimeZoneResidence: (timezones, cities),
+    City: (cities,),
+    LevelLanguageTitle: (level_titles, levels),
+    LevelLanguageKnowledge: (level_knowledges, levels),
+    LevelLanguage: (levels,),
+    SkillProgramming: (skills,),
+}
+
+
+# Foreign key of Human -> cache of its rows, see attach_references().
+HUMAN_REFERENCES = {
+    "gender": genders,
+    "city": cities,
+    "level_english": levels,
+}
+
+
+def attach_references(human) -> None:
+    """
+    Related rows of human from caches instead of JOIN, as select_related() would
+    set them, so __str__ of them reads nothing. Rows are shared, don't change them.
+    Row missing in cache (added less than check_interval ago) is read as usual.
+    """
+    for field, reference_cache in HUMAN_REFERENCES.items():
+        obj = reference_cache.get(getattr(human, field + "_id"))
+        if obj is not None:
+            human._meta.get_field(field).set_cached_value(human, obj)
+
+
+def invalidate_reference_cache(sender, using=None, **kwargs) -> None:
+    # After commit: before it other processes would load old rows under new version.
+    for reference_cache in REFERENCE_CACHES[sender]:
+        transaction.on_commit(reference_cache.invalidate, using=using)
+
+
+for model in REFERENCE_CACHES:
+    post_save.connect(invalidate_reference_cache, sender=model, dispatch_uid="reference_cache")
+    post_delete.connect(invalidate_reference_cache, sender=model, dispatch_uid="reference_cache")
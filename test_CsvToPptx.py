@@ -0,0 +1,74 @@
+import io
+import os
+import tempfile
+import unittest
+from pptx import Presentation
+from pptx.util import Inches
+from CsvToPptx import CsvToPptx
+
+
+def make_template(filename: str) -> None:
+    """
+    PPTX-file with {{name}} split between runs, as PowerPoint saves it after editing.
+    """
+    prs = Presentation()
+    slide = prs.slides.add_slide(prs.slide_layouts[6])
+    paragraph = slide.shapes.add_textbox(Inches(1), Inches(1), Inches(4), Inches(1)).text_frame.paragraphs[0]
+    for text in ("Hi {{na", "me}}", "!", " {{city}}"):
+        paragraph.add_run().text = text
+    paragraph.runs[0].font.bold = True
+    prs.save(filename)
+
+
+class TemplateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.template = os.path.join(self.directory.name, "template.pptx")
+        make_template(self.template)
+        self.converter = CsvToPptx(pptx_filename_input=self.template)
+
+
+class CsvToPptxRenderTest(TemplateTestCase):
+
+    def render(self, row: dict) -> list:
+        self.converter.reset_pptx()
+        self.converter.render(row)
+        prs = Presentation(io.BytesIO(self.converter.save_pptx_to_bytes()))
+        return [run.text for run in prs.slides[0].shapes[0].text_frame.paragraphs[0].runs]
+
+    def test_token_split_between_runs(self):
+        self.assertEqual(self.render({"name": "Ann", "city": "Oslo"}), ["Hi Ann", "", "!", " Oslo"])
+        self.assertEqual(self.render({"name": "Bob"}), ["Hi Bob", "", "!", " {{city}}"])
+
+    def test_value_gets_format_of_first_run(self):
+        self.converter.reset_pptx()
+        self.converter.render({"name": "Ann"})
+        self.assertTrue(self.converter.prs.slides[0].shapes[0].text_frame.paragraphs[0].runs[0].font.bold)
+
+
+class CsvToPptxFilenameTest(TemplateTestCase):
+    """
+    Values of rows can't move decks out of output directory.
+    """
+
+    def test_batch_render_rejects_path_in_value(self):
+        dir_output = os.path.join(self.directory.name, "decks", "output")
+        rows = [(1, {"name": "../../escape", "city": ""}), (2, {"name": "Ann", "city": ""})]
+        results = self.converter.batch_render(None, os.path.join(dir_output, "{name}.pptx"), workers=1, rows=rows)
+        self.assertIn("ValueError", results[0].error)
+        self.assertIsNone(results[1].error)
+        self.assertEqual(os.listdir(dir_output), ["Ann.pptx"])
+        self.assertFalse(os.path.exists(os.path.join(self.directory.name, "escape.pptx")))
+
+    def test_pipeline_rejects_path_in_value(self):
+        dir_output = os.path.join(self.directory.name, "output")
+        rows = [(1, {"name": "..", "city": ""}), (2, {"name": "sub/Ann", "city": ""}), (3, {"name": "Bob", "city": ""})]
+        results = self.converter.pipeline(None, "{name}.pptx", upload=False, dir_output=dir_output, rows=rows)
+        self.assertEqual([result.error is None for result in results], [False, False, True])
+        self.assertEqual(os.listdir(dir_output), ["Bob.pptx"])
+
+
+if __name__ == "__main__":
+    unittest.main()
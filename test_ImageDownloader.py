@@ -0,0 +1,103 @@
+import collections
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ImageDownloader import ImageDownloader
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    """
+    /a/img.png and /b/img.png: other images with the same basename, revalidated by ETag;
+    /flaky.png: 503 on the first request.
+    """
+    images = {"/a/img.png": b"image-a", "/b/img.png": b"image-b", "/flaky.png": b"image-flaky"}
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests[self.path] += 1
+            number = server.requests[self.path]
+        if self.path not in self.images or (self.path == "/flaky.png" and number == 1):
+            self.send_response(404 if self.path not in self.images else 503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        etag = '"{0}"'.format(self.path)
+        if self.headers.get("If-None-Match") == etag:
+            server.not_modified += 1
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(self.images[self.path])))
+        self.end_headers()
+        self.wfile.write(self.images[self.path])
+
+    def log_message(self, *args):
+        pass
+
+
+class ImageDownloaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = collections.Counter()
+        self.server.not_modified = 0
+        thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.downloader = self.new_downloader()
+
+    def new_downloader(self) -> ImageDownloader:
+        downloader = ImageDownloader(dir_cache=self.directory.name, max_workers=4, timeout=5, backoff_factor=0)
+        # Proxy of environment must not catch requests to local server.
+        downloader.session.trust_env = False
+        self.addCleanup(downloader.close)
+        return downloader
+
+    def url(self, path: str) -> str:
+        return "http://127.0.0.1:{0}{1}".format(self.server.server_port, path)
+
+    @staticmethod
+    def read(filename: str) -> bytes:
+        with open(filename, 'rb') as f:
+            return f.read()
+
+    def test_revalidate_by_etag(self):
+        filename = self.downloader.fetch(self.url("/a/img.png"))
+        self.assertEqual(self.read(filename), b"image-a")
+        # Other process: cache on disk is revalidated, not downloaded again.
+        self.assertEqual(self.new_downloader().fetch(self.url("/a/img.png")), filename)
+        self.assertEqual(self.server.requests["/a/img.png"], 2)
+        self.assertEqual(self.server.not_modified, 1)
+
+    def test_same_basename_kept_apart(self):
+        filename_a = self.downloader.fetch(self.url("/a/img.png"))
+        filename_b = self.downloader.fetch(self.url("/b/img.png"))
+        self.assertNotEqual(filename_a, filename_b)
+        self.assertEqual(self.read(filename_a), b"image-a")
+        self.assertEqual(self.read(filename_b), b"image-b")
+
+    def test_retry_on_503(self):
+        filename = self.downloader.fetch(self.url("/flaky.png"))
+        self.assertEqual(self.read(filename), b"image-flaky")
+        self.assertEqual(self.server.requests["/flaky.png"], 2)
+
+    def test_missing_image(self):
+        self.assertEqual(self.downloader.fetch(self.url("/missing.png")), "")
+
+    def test_prefetch_each_url_once(self):
+        urls = [self.url("/a/img.png"), self.url("/b/img.png"), self.url("/a/img.png"), "", self.url("/b/img.png")]
+        files = self.downloader.prefetch(urls)
+        self.assertEqual(list(files), [self.url("/a/img.png"), self.url("/b/img.png")])
+        self.assertEqual(self.server.requests, {"/a/img.png": 1, "/b/img.png": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
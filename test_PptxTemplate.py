@@ -0,0 +1,84 @@
+import io
+import os
+import tempfile
+import unittest
+from pptx import Presentation
+from pptx.util import Inches
+from PptxTemplate import PptxTemplate
+from CsvToPptx import CsvToPptx
+
+
+def make_template() -> bytes:
+    """
+    :return: PPTX-file with one slide and {{name}} in its text
+    """
+    prs = Presentation()
+    slide = prs.slides.add_slide(prs.slide_layouts[5])
+    slide.shapes.title.text = "Hello {{name}}"
+    slide.shapes.add_textbox(Inches(1), Inches(2), Inches(4), Inches(1)).text_frame.text = "City: {{city}}"
+    prs.core_properties.title = "Template"
+    buffer = io.BytesIO()
+    prs.save(buffer)
+    return buffer.getvalue()
+
+
+class PptxTemplateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.template = PptxTemplate(make_template())
+        self.assertTrue(self.template.fast)
+
+    def shared_blobs(self) -> dict:
+        return {part.partname: part.blob for part in self.template.parts_shared}
+
+    def save(self, prs):
+        buffer = io.BytesIO()
+        self.template.save(prs, buffer)
+        return Presentation(buffer)
+
+    def test_shared_parts_unchanged(self):
+        blobs = self.shared_blobs()
+        prs = self.template.new_presentation()
+        prs.slides[0].shapes.title.text = "Hello Ann"
+        prs.slides.add_slide(prs.slide_layouts[1]).shapes.title.text = "Added"
+        prs.core_properties.title = "Ann"
+        saved = self.save(prs)
+        self.assertEqual(self.shared_blobs(), blobs)
+        self.assertEqual([slide.shapes.title.text for slide in saved.slides], ["Hello Ann", "Added"])
+        self.assertEqual(len(self.template.new_presentation().slides), 1)
+
+    def test_render_keeps_shared_parts(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "template.pptx")
+            with open(filename, 'wb') as f:
+                f.write(self.template.template)
+            converter = CsvToPptx(pptx_filename_input=filename)
+            blobs = {part.partname: part.blob for part in converter.pptx_template.parts_shared}
+            for name in ("Ann", "Bob"):
+                converter.reset_pptx()
+                converter.render({"name": name, "city": "Oslo"})
+                saved = Presentation(io.BytesIO(converter.save_pptx_to_bytes()))
+                self.assertEqual([shape.text_frame.text for shape in saved.slides[0].shapes],
+                                 ["Hello " + name, "City: Oslo"])
+            self.assertEqual({part.partname: part.blob for part in converter.pptx_template.parts_shared}, blobs)
+
+    def test_core_properties_per_deck(self):
+        prs = self.template.new_presentation()
+        prs.core_properties.title = "X"
+        self.assertEqual(self.save(prs).core_properties.title, "X")
+        prs_next = self.template.new_presentation()
+        self.assertEqual(prs_next.core_properties.title, "Template")
+        self.assertEqual(self.save(prs_next).core_properties.title, "Template")
+
+    def test_same_as_parsed(self):
+        prs = self.template.new_presentation()
+        saved = self.save(prs)
+        parsed = Presentation(io.BytesIO(self.template.template))
+        self.assertEqual([[shape.text_frame.text for shape in slide.shapes if shape.has_text_frame]
+                          for slide in saved.slides],
+                         [[shape.text_frame.text for shape in slide.shapes if shape.has_text_frame]
+                          for slide in parsed.slides])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import io
+import os
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from SftpUploader import SftpUploader, SHA1_SUFFIX
+from CsvToPptx import CsvToPptx
+from test_CsvToPptx import make_template
+
+
+class FakeSftp:
+    """
+    pysftp.Connection over dict: path -> bytes, shared by all sessions like one server.
+    """
+
+    def __init__(self, files: dict, lock: threading.Lock):
+        self.files = files
+        self.lock = lock
+        self.opened = []
+        self.sftp_client = SimpleNamespace(posix_rename=self.rename)
+
+    def stat(self, path):
+        if path not in self.files:
+            raise IOError(path)
+        return SimpleNamespace(st_size=len(self.files[path]))
+
+    def open(self, path, mode='rb'):
+        if path not in self.files:
+            raise IOError(path)
+        self.opened.append(path)
+        return io.BytesIO(self.files[path])
+
+    def putfo(self, fileobj, path):
+        with self.lock:
+            self.files[path] = fileobj.read()
+
+    def put(self, filename, path):
+        with open(filename, 'rb') as f:
+            self.putfo(f, path)
+
+    def exists(self, path):
+        return path in self.files
+
+    def remove(self, path):
+        with self.lock:
+            if self.files.pop(path, None) is None:
+                raise IOError(path)
+
+    def rename(self, path, path_new):
+        with self.lock:
+            self.files[path_new] = self.files.pop(path)
+
+    def close(self):
+        pass
+
+
+class SftpUploaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.files = {}
+        self.sessions = []
+        lock = threading.Lock()
+
+        def connect(uploader):
+            self.sessions.append(FakeSftp(self.files, lock))
+            return self.sessions[-1]
+
+        patcher = mock.patch.object(SftpUploader, "_connect", connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.uploader = SftpUploader(dir_target="/public", connections=2)
+        self.addCleanup(self.uploader.close)
+
+    def opened(self) -> list:
+        return [path for session in self.sessions for path in session.opened]
+
+    def test_same_content_skipped_by_sha1(self):
+        first = self.uploader.upload_fileobj(io.BytesIO(b"deck-1"), "a.pptx")
+        self.assertFalse(first.skipped)
+        self.assertEqual(set(self.files), {"/public/a.pptx", "/public/a.pptx" + SHA1_SUFFIX})
+        self.assertTrue(self.uploader.upload_fileobj(io.BytesIO(b"deck-1"), "a.pptx").skipped)
+        # Deck itself is never downloaded, only its SHA1.
+        self.assertEqual(self.opened(), ["/public/a.pptx" + SHA1_SUFFIX])
+
+    def test_same_size_other_content_uploaded(self):
+        self.uploader.upload_fileobj(io.BytesIO(b"deck-1"), "a.pptx")
+        result = self.uploader.upload_fileobj(io.BytesIO(b"deck-2"), "a.pptx")
+        self.assertFalse(result.skipped)
+        self.assertIsNone(result.error)
+        self.assertEqual(self.files["/public/a.pptx"], b"deck-2")
+        self.assertTrue(self.uploader.upload_fileobj(io.BytesIO(b"deck-2"), "a.pptx").skipped)
+
+    def test_file_without_sha1_uploaded(self):
+        self.files["/public/a.pptx"] = b"deck-1"
+        self.assertFalse(self.uploader.upload_fileobj(io.BytesIO(b"deck-1"), "a.pptx").skipped)
+        self.assertIn("/public/a.pptx" + SHA1_SUFFIX, self.files)
+
+    def test_remove_with_sha1(self):
+        self.uploader.upload_fileobj(io.BytesIO(b"deck-1"), "a.pptx")
+        self.assertTrue(self.uploader.remove("a.pptx"))
+        self.assertEqual(self.files, {})
+        self.assertFalse(self.uploader.remove("a.pptx"))
+
+    def test_pipeline_upload(self):
+        with tempfile.TemporaryDirectory() as directory:
+            template = os.path.join(directory, "template.pptx")
+            make_template(template)
+            converter = CsvToPptx(pptx_filename_input=template)
+            self.addCleanup(lambda: converter.sftp_uploader.close())
+            rows = [(1, {"name": "Ann", "city": ""}), (2, {"name": "Bob", "city": ""})]
+            results = converter.pipeline(None, "{name}.pptx", rows=rows)
+            self.assertEqual([result.error for result in results], [None, None])
+            self.assertEqual(sorted(self.files), ["/public/Ann.pptx", "/public/Ann.pptx" + SHA1_SUFFIX,
+                                                  "/public/Bob.pptx", "/public/Bob.pptx" + SHA1_SUFFIX])
+            self.assertEqual(self.files["/public/Ann.pptx"][:2], b"PK")
+            converter.pipeline(None, "{name}.pptx", rows=rows)
+            self.assertEqual(converter.metrics.counters.get("upload_skipped"), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
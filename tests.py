@@ -0,0 +1,378 @@
+import os
+import tempfile
+from unittest import mock
+from django.test import TestCase
+from django.db import connection, DatabaseError
+from django.db.models.signals import post_save
+from rest_framework.test import APIRequestFactory, force_authenticate
+from events.models import Team
+from users.models import CustomUser as User
+from django.test.utils import CaptureQueriesContext
+from . import reference_cache
+from .human_export import write_csv
+from . import human_import
+from .human_import import HumanImporter
+from .human_token import TokenCache, token_cache, get_human_by_token, rotate_tokens
+from . import views, wa_worker
+from .views import BulkUpdateTeamAndCreateUsers, CreateTeamView
+from .wa_worker import WAGroupWorker
+from .models import (TeamChat, Human, Gender, City, Country, TimeZoneResidence, LevelLanguage,
+                     LevelLanguageTitle, LevelLanguageKnowledge, SkillProgramming)
+
+
+def create_humans(count: int) -> None:
+    gender = Gender.objects.create(gender="female")
+    city = City.objects.create(title="Oslo",
+                               country=Country.objects.create(domen="no", title="Norway"),
+                               timezone=TimeZoneResidence.objects.create(timezone="CET", hours=1))
+    level = LevelLanguage.objects.create(CEFR="CEFR",
+                                         level=LevelLanguageTitle.objects.create(suffix="B2", title="Upper"),
+                                         knowledge=LevelLanguageKnowledge.objects.create(title="INDEPENDENT"))
+    skills = [SkillProgramming.objects.create(title=title) for title in ("Python", "Django", "SQL")]
+    for idx in range(count):
+        human = Human.objects.create(surname="Surname%d" % idx, name="Name%d" % idx,
+                                     email="user%d@example.com" % idx,
+                                     gender=gender, city=city, level_english=level)
+        human.skills_programming.set(skills[:idx % 3 + 1])
+
+
+class HumanPageQueriesTest(TestCase):
+    """
+    Page of Human with related rows costs the same number of queries for any size.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        create_humans(30)
+
+    @staticmethod
+    def read(humans: list) -> list():
+        # Everything a list shows: __str__ chains of related rows and skills.
+        return [(str(human), str(human.gender), str(human.city), str(human.level_english),
+                 [str(skill) for skill in human.skills_programming.all()]) for human in humans]
+
+    def test_page_queries_dont_depend_on_size(self):
+        for size in (1, 5, 25):
+            with self.assertNumQueries(2):
+                humans, cursor = Human.objects.with_related().page(None, size)
+                self.read(humans)
+            self.assertEqual(len(humans), size)
+            self.assertIsNotNone(cursor)
+
+    def test_next_page_by_cursor(self):
+        humans, cursor = Human.objects.with_related().page(None, 10)
+        with self.assertNumQueries(2):
+            humans_next, cursor_next = Human.objects.with_related().page(cursor, 10)
+            self.read(humans_next)
+        self.assertEqual(len(humans_next), 10)
+        self.assertFalse({human.pk for human in humans} & {human.pk for human in humans_next})
+
+    def test_pages_cover_all_humans_once(self):
+        seen, cursor = [], None
+        while True:
+            humans, cursor = Human.objects.page(cursor, 7)
+            seen += [human.pk for human in humans]
+            if cursor is None:
+                break
+        self.assertEqual(sorted(seen), sorted(Human.objects.values_list("pk", flat=True)))
+
+    def test_cursor_starts_index_range(self):
+        # Deep page must not walk newer rows: range of index, not a scan of it.
+        _, cursor = Human.objects.page(None, 10)
+        plan = Human.objects.after(cursor)[:11].explain()
+        if connection.vendor == "sqlite":
+            self.assertIn("SEARCH", plan)
+            self.assertIn("human_page (created_at<?)", plan)
+        elif connection.vendor == "postgresql":
+            # Table of test is small, planner would scan it whatever indexes are.
+            with connection.cursor() as cursor_db:
+                cursor_db.execute("SET LOCAL enable_seqscan = off")
+            plan = Human.objects.after(cursor)[:11].explain()
+            self.assertIn("Index Cond", plan)
+
+    def test_bad_cursor(self):
+        with self.assertRaises(ValueError):
+            Human.objects.page("not a cursor", 10)
+
+
+class ReferenceCacheTest(TestCase):
+    """
+    Lists read gender, city and level from reference_cache, which is invalidated after commit.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        create_humans(30)
+
+    def setUp(self):
+        # Caches live in process: rows of other tests must not be there.
+        for cache in reference_cache.HUMAN_REFERENCES.values():
+            cache.load()
+
+    def test_page_reads_no_reference_rows(self):
+        with CaptureQueriesContext(connection) as queries:
+            humans, cursor = Human.objects.with_references().page(None, 25)
+            rows = HumanPageQueriesTest.read(humans)
+        self.assertEqual(len(queries), 2)
+        for table in ("humans_city", "humans_country", "humans_gender", "humans_levellanguage"):
+            self.assertFalse([query for query in queries if table in query["sql"]], table)
+        self.assertEqual(rows, HumanPageQueriesTest.read(Human.objects.with_related().page(None, 25)[0]))
+
+    def test_invalidate_after_commit(self):
+        version = reference_cache.cities.version()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            city = City.objects.get()
+            city.title = "Bergen"
+            city.save()
+            self.assertEqual(reference_cache.cities.version(), version)
+        self.assertTrue(callbacks)
+        self.assertNotEqual(reference_cache.cities.version(), version)
+        self.assertEqual(reference_cache.cities.get(city.pk).title, "Bergen")
+
+
+class HumanCsvRoundTripTest(TestCase):
+    """
+    File of export_humans is read back by import_humans with default dialect.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        create_humans(3)
+        Human.objects.filter(email="user0@example.com").update(nickname='Doe, "J" | jr', middle_name="a;b")
+        # Same titles as reference rows of create_humans(): only ids tell them apart.
+        city = City.objects.get()
+        level = LevelLanguage.objects.get()
+        Human.objects.filter(email="user1@example.com").update(
+            city=City.objects.create(title="Oslo", country=Country.objects.create(domen="us", title="USA"),
+                                     timezone=city.timezone),
+            level_english=LevelLanguage.objects.create(CEFR="NO CEFR", level=level.level, knowledge=level.knowledge))
+        for cache in reference_cache.HUMAN_REFERENCES.values():
+            cache.load()
+
+    def test_export_import(self):
+        rows = HumanPageQueriesTest.read(Human.objects.with_related().order_by("email"))
+        nicknames = list(Human.objects.order_by("email").values_list("nickname", "middle_name",
+                                                                     "city", "level_english"))
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "humans.csv")
+            self.assertEqual(write_csv(Human.objects.all(), filename), 3)
+            Human.objects.all().delete()
+            result = HumanImporter().import_file(filename)
+        self.assertEqual((result["created"], result["errors"]), (3, []))
+        self.assertEqual(HumanPageQueriesTest.read(Human.objects.with_related().order_by("email")), rows)
+        self.assertEqual(list(Human.objects.order_by("email").values_list("nickname", "middle_name",
+                                                                          "city", "level_english")), nicknames)
+
+    def test_too_long_value(self):
+        importer = HumanImporter()
+        self.assertIsNone(importer.build_human(2, {"surname": "x" * 201, "name": "John"}))
+        self.assertEqual(importer.errors, [(2, "surname is longer than 200")])
+
+    def test_bad_row_of_batch(self):
+        # Row rejected by database: other rows of its batch are saved, the row is in errors.
+        token = Human.objects.first().token
+        rows = [{"surname": "Doe", "name": name, "email": name + "@example.com"} for name in ("Ann", "Bob", "Eve")]
+        importer = HumanImporter(batch_size=10)
+        with mock.patch.object(human_import, "generate_token", side_effect=["t-ann", token, "t-eve"]):
+            result = importer.import_rows(rows)
+        self.assertEqual(result["created"], 2)
+        self.assertEqual([number_row for number_row, _ in result["errors"]], [3])
+        self.assertIn("IntegrityError", result["errors"][0][1])
+        self.assertEqual(set(Human.objects.filter(surname="Doe").values_list("name", flat=True)), {"Ann", "Eve"})
+
+    def test_id_of_other_row(self):
+        city = City.objects.filter(country__domen="no").get()
+        row = {"surname": "Doe", "name": "John", "city": "Oslo", "city_id": str(city.pk)}
+        importer = HumanImporter()
+        self.assertEqual(importer.build_human(2, row)[0].city, city)
+        self.assertIsNone(importer.build_human(3, dict(row, city="Bergen")))
+        self.assertIsNone(importer.build_human(4, dict(row, city_id="999")))
+        self.assertEqual([number_row for number_row, _ in importer.errors], [3, 4])
+
+
+class TokenCacheTest(TestCase):
+    """
+    Changed, deleted and rotated humans are not found by old cached rows.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        create_humans(2)
+
+    def setUp(self):
+        token_cache.clear()
+
+    def test_deleted_human(self):
+        human = Human.objects.get(email="user0@example.com")
+        self.assertEqual(get_human_by_token(human.token), human)
+        with self.captureOnCommitCallbacks(execute=True):
+            human.delete()
+        with self.assertNumQueries(1):
+            self.assertIsNone(get_human_by_token(human.token))
+
+    def test_changed_human(self):
+        human = Human.objects.get(email="user0@example.com")
+        get_human_by_token(human.token)
+        with self.captureOnCommitCallbacks(execute=True):
+            Human.objects.filter(pk=human.pk).update(surname="Changed")
+            Human.objects.get(pk=human.pk).save()
+        self.assertEqual(get_human_by_token(human.token).surname, "Changed")
+
+    def test_other_process_sees_rotation(self):
+        human = Human.objects.get(email="user0@example.com")
+        other = TokenCache(check_interval=0)
+        other.refresh()
+        other.set(human.token, human)
+        with self.captureOnCommitCallbacks(execute=True):
+            rotate_tokens(Human.objects.filter(pk=human.pk))
+        self.assertEqual(other.get(human.token), (False, None))
+
+    def test_lookup_before_invalidate_is_not_stored(self):
+        human = Human.objects.get(email="user0@example.com")
+        version = token_cache.refresh()
+        token_cache.invalidate()
+        token_cache.refresh()
+        token_cache.set(human.token, human, version)
+        self.assertEqual(token_cache.get(human.token), (False, None))
+
+
+class BulkCreateUsersTest(TestCase):
+    """
+    Players from chat: same validation and signals as single create, one insert.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.team = Team.objects.create(title="Team", WA_chatId="group@g.us")
+        cls.user = User.objects.create(phone="+79990000001")
+
+    def post(self, phones: list):
+        request = APIRequestFactory().post("/", {"groupId": "group@g.us", "phones": phones}, format="json")
+        return BulkUpdateTeamAndCreateUsers.as_view()(request)
+
+    def test_create_players(self):
+        saved = []
+
+        def on_saved(sender, instance, created, **kwargs):
+            saved.append((instance.phone, created))
+
+        post_save.connect(on_saved, sender=User, dispatch_uid="test_bulk_users")
+        self.addCleanup(post_save.disconnect, sender=User, dispatch_uid="test_bulk_users")
+        response = self.post(["+79990000001", "79990000002", "+123", "phone"])
+        self.assertEqual(response.status_code, 201)
+        results = response.data["results"]
+        self.assertEqual([result.get("user_exists") for result in results], [True, False, None, None])
+        self.assertIn("error", results[2])
+        self.assertIn("error", results[3])
+        self.assertEqual(saved, [("+79990000002", True)])
+        self.assertTrue(User.objects.get(phone="+79990000002").check_password("0002"))
+        self.assertEqual(set(self.team.players.values_list("phone", flat=True)), {"+79990000001", "+79990000002"})
+
+    def test_phone_inserted_by_parallel_request(self):
+        # Phone appears between select and insert: its user is taken, no IntegrityError.
+        validate_users = BulkUpdateTeamAndCreateUsers.validate_users
+
+        def validate_and_race(phones):
+            result = validate_users(phones)
+            User.objects.create(phone="+79990000003")
+            return result
+
+        with mock.patch.object(BulkUpdateTeamAndCreateUsers, "validate_users", staticmethod(validate_and_race)):
+            response = self.post(["+79990000003"])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["results"][0]["user_id"], User.objects.get(phone="+79990000003").id)
+        self.assertTrue(self.team.players.filter(phone="+79990000003").exists())
+
+
+class FakeBot:
+    """
+    Bot which answers from list: exception is raised, anything else is returned.
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def add_group_and_promote(self, phone, chatName):
+        self.calls.append((phone, chatName))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class WAGroupWorkerTest(TestCase):
+    """
+    Group is created once, retried only when the request surely didn't reach WhatsApp.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.team = Team.objects.create(title="Team")
+        cls.chat = TeamChat.objects.create(team=cls.team, idempotency_key="key", phone="79990000001",
+                                           chat_name="Шейкер - Team")
+
+    def process(self, *responses):
+        bot = FakeBot(*responses)
+        worker = WAGroupWorker(bot_factory=lambda: bot, retries=3, backoff=0, retry_errors=(ConnectionRefusedError,))
+        return worker.process(self.chat.pk), bot, TeamChat.objects.select_related("team").get(pk=self.chat.pk)
+
+    def test_claimed_once(self):
+        created, bot, chat = self.process({"groupId": "group@g.us"})
+        self.assertTrue(created)
+        self.assertEqual((chat.status, chat.attempts, chat.team.WA_chatId), (TeamChat.STATUS_DONE, 1, "group@g.us"))
+        self.assertEqual(bot.calls, [("79990000001", "Шейкер - Team")])
+        created, bot, chat = self.process({"groupId": "other@g.us"})
+        self.assertFalse(created)
+        self.assertEqual((bot.calls, chat.team.WA_chatId), ([], "group@g.us"))
+
+    def test_retry_not_sent_request(self):
+        with self.assertLogs(wa_worker.logger, "WARNING"):
+            created, bot, chat = self.process(ConnectionRefusedError("refused"), {"groupId": "group@g.us"})
+        self.assertTrue(created)
+        self.assertEqual((chat.status, chat.attempts, len(bot.calls)), (TeamChat.STATUS_DONE, 2, 2))
+
+    def test_timeout_not_retried(self):
+        with self.assertLogs(wa_worker.logger, "ERROR"):
+            created, bot, chat = self.process(TimeoutError("read timeout"), {"groupId": "group@g.us"})
+        self.assertFalse(created)
+        self.assertEqual((chat.status, chat.attempts, len(bot.calls)), (TeamChat.STATUS_FAILED, 1, 1))
+        self.assertIn("TimeoutError", chat.error)
+
+    def test_failed_save_ends_failed(self):
+        with mock.patch.object(Team, "save", side_effect=DatabaseError("connection lost")), \
+                self.assertLogs(wa_worker.logger, "ERROR"):
+            created, bot, chat = self.process({"groupId": "group@g.us"})
+        self.assertFalse(created)
+        self.assertEqual(chat.status, TeamChat.STATUS_FAILED)
+        self.assertIn("connection lost", chat.error)
+
+
+class CreateTeamIdempotencyTest(TestCase):
+    """
+    Repeated request with the same Idempotency-Key returns the first team, group is created once.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(phone="+79990000001")
+
+    def post(self, key: str):
+        request = APIRequestFactory().post("/", {"title": "Team"}, format="json", HTTP_IDEMPOTENCY_KEY=key)
+        force_authenticate(request, user=self.user)
+        return CreateTeamView.as_view()(request)
+
+    def test_replay(self):
+        with mock.patch.object(views, "get_worker") as get_worker:
+            with self.captureOnCommitCallbacks(execute=True):
+                first = self.post("key-1")
+            with self.captureOnCommitCallbacks(execute=True):
+                replay = self.post("key-1")
+            with self.captureOnCommitCallbacks(execute=True):
+                other = self.post("key-2")
+        self.assertEqual((first.status_code, replay.status_code, other.status_code), (201, 200, 201))
+        self.assertEqual(replay.data["id"], first.data["id"])
+        self.assertNotEqual(other.data["id"], first.data["id"])
+        self.assertEqual(replay.data["chat_status"], TeamChat.STATUS_PENDING)
+        self.assertEqual(get_worker.return_value.submit.call_count, 2)
+        self.assertEqual(TeamChat.objects.get(team_id=first.data["id"]).phone, "79990000001")
@@ -8,8 +8,17 @@ from events.models import Team, Event
 from .serealizers import TeamSerializer, CreateTeamSerializer
 from users.serializers import CreateUserSerializer
 from users.models import CustomUser as User
-from wabot.wabot import WABot
+from .models import Human, HumanProfile, TeamChat
+from .human_profile import profile_data
+from .human_export import csv_response
+from .wa_worker import get_worker
 from django.core.exceptions import ObjectDoesNotExist
+from django.contrib.auth.hashers import make_password
+from concurrent.futures import ThreadPoolExecutor
+from django.db import transaction, IntegrityError
+from django.db.models.signals import post_save
+import hashlib
+import uuid
 
 
 class CreateTeamView(generics.CreateAPIView):
@@ -27,18 +36,38 @@ class CreateTeamView(generics.CreateAPIView):
         return self.create(request, *args, **kwargs)
 
     def create(self, request, *args, **kwargs):
+        """
+        Team is saved at once with pending chat, WhatsApp group is created by wa_worker.
+        Repeated request with the same Idempotency-Key header returns the same team.
+        """
         phone = str(self.request.user.phone)[1:]
-        bot = WABot()
+        key = request.headers.get('Idempotency-Key')
+        key = hashlib.sha1(f"{request.user.id}:{key}".encode()).hexdigest() if key else uuid.uuid4().hex
+        try:
+            chat = TeamChat.objects.select_related('team').get(idempotency_key=key)
+            serializer = self.get_serializer(instance=chat.team)
+            return Response(dict(serializer.data, chat_status=chat.status), status=status.HTTP_200_OK)
+        except TeamChat.DoesNotExist:
+            pass
         serializer = self.get_serializer(data=request.data)
         headers = self.get_success_headers(serializer.initial_data)
         if serializer.is_valid():
-            response = bot.add_group_and_promote(phone=phone, chatName=f"Шейкер - {request.data.get('title')}")
-            print(response)
-            if response.get('groupId'):
-                team = serializer.save()
-                team.WA_chatId = response['groupId']
-                team.save()
-                return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+            try:
+                with transaction.atomic():
+                    team = serializer.save()
+                    chat = TeamChat.objects.create(team=team, idempotency_key=key, phone=phone,
+                                                   chat_name=f"Шейкер - {request.data.get('title')}")
+                    transaction.on_commit(lambda: get_worker().submit(chat.id))
+            except IntegrityError as e:
+                # Same Idempotency-Key in parallel request: its team is the answer.
+                chat = TeamChat.objects.select_related('team').filter(idempotency_key=key).first()
+                if chat is None:
+                    # Other constraint of team, not a race of the key.
+                    return Response(data={'error': str(e)}, status=status.HTTP_400_BAD_REQUEST, headers=headers)
+                serializer = self.get_serializer(instance=chat.team)
+                return Response(dict(serializer.data, chat_status=chat.status), status=status.HTTP_200_OK)
+            return Response(dict(serializer.data, chat_status=chat.status),
+                            status=status.HTTP_201_CREATED, headers=headers)
 
         return Response(data={'error': serializer.errors}, status=status.HTTP_400_BAD_REQUEST, headers=headers)
 
@@ -81,3 +110,178 @@ class UpdateTeamAndCreateUser(generics.CreateAPIView):
         if not chatId:
             errors.append({'chatId': 'не указа chatId'})
         return Response(data={'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class HumanListView(APIView):
+    """
+    Page of humans: GET ?cursor=<next>&size=50, newest first.
+    Constant number of queries for any size of page, reference rows from reference_cache.
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    page_size = 50
+    page_size_max = 200
+
+    @staticmethod
+    def human_to_dict(human: Human) -> dict:
+        return profile_data(human)
+
+    def get(self, request, *args, **kwargs):
+        try:
+            size = min(int(request.query_params.get('size', self.page_size)), self.page_size_max)
+            humans, cursor = Human.objects.with_references().page(request.query_params.get('cursor'), max(size, 1))
+        except ValueError as e:
+            return Response(data={'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'results': [self.human_to_dict(human) for human in humans], 'next': cursor})
+
+
+class HumanProfileListView(HumanListView):
+    """
+    Page of human cards from HumanProfile: one indexed query.
+    """
+
+    def get(self, request, *args, **kwargs):
+        try:
+            size = min(int(request.query_params.get('size', self.page_size)), self.page_size_max)
+            profiles, cursor = HumanProfile.objects.page(request.query_params.get('cursor'), max(size, 1))
+        except ValueError as e:
+            return Response(data={'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'results': [profile.data for profile in profiles], 'next': cursor})
+
+
+class HumanSearchView(APIView):
+    """
+    Search of humans: GET ?q=&surname=&email=&phone=&token=&city=&level_english=&skills=1,2&size=50
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    page_size = 50
+    page_size_max = 200
+
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        try:
+            size = max(min(int(params.get('size', self.page_size)), self.page_size_max), 1)
+            skills = [int(skill) for skill in params.get('skills', '').split(',') if skill]
+            queryset = Human.objects.with_references().search(
+                text=params.get('q'), surname=params.get('surname'), email=params.get('email'),
+                phone=params.get('phone'), token=params.get('token'),
+                city=params.get('city'), level_english=params.get('level_english'), skills=skills)
+            if not params.get('q'):
+                humans, cursor = queryset.page(params.get('cursor'), size)
+            else:
+                humans, cursor = list(queryset[:size]), None
+        except ValueError as e:
+            return Response(data={'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'results': [HumanListView.human_to_dict(human) for human in humans], 'next': cursor})
+
+
+class BulkUpdateTeamAndCreateUsers(generics.CreateAPIView):
+    """
+    Create players from chat, many at once: {'groupId': ..., 'phones': [...]}.
+    New users are validated by CreateUserSerializer as in UpdateTeamAndCreateUser,
+    written by one INSERT and get post_save as if created one by one.
+    """
+    password_workers = 8
+
+    @staticmethod
+    def normalize_phone(phone) -> str:
+        """
+        :return: '+' and digits, '' if phone is bad
+        """
+        digits = str(phone or '').strip().lstrip('+')
+        return '+' + digits if digits.isdigit() else ''
+
+    def create(self, request, *args, **kwargs):
+        errors = []
+        chatId = request.data.get('groupId')
+        phones = request.data.get('phones')
+        if not chatId:
+            errors.append({'chatId': 'не указа chatId'})
+        if not phones or not isinstance(phones, list):
+            errors.append({'phones': 'не указаны телефоны'})
+        if errors:
+            return Response(data={'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            team = Team.objects.get(WA_chatId=chatId)
+        except Team.DoesNotExist:
+            errors.append({'chatId': 'нет команды с таким chatId'})
+            return Response(data={'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        valid = []
+        for phone in map(self.normalize_phone, phones):
+            if phone and phone not in valid:
+                valid.append(phone)
+
+        users = {str(user.phone): user for user in User.objects.filter(phone__in=valid)}
+        missing = [phone for phone in valid if phone not in users]
+        data, invalid = self.validate_users(missing)
+        # Hashing of password is the slow part; hashlib releases GIL, so threads help.
+        # Done before transaction: it would hold locks for all this time.
+        with ThreadPoolExecutor(max_workers=self.password_workers) as executor:
+            passwords = list(executor.map(lambda item: make_password(item['password']), data))
+        created = [User(**dict(item, password=password)) for item, password in zip(data, passwords)]
+        with transaction.atomic():
+            # Same new phone in parallel request: insert of one of them is skipped,
+            # both take the user which is in table.
+            User.objects.bulk_create(created, ignore_conflicts=True)
+            passwords = set(passwords)
+            for user in User.objects.filter(phone__in=[str(user.phone) for user in created]):
+                users[str(user.phone)] = user
+                if user.password in passwords:
+                    # Inserted by this request: handlers of single create get it too,
+                    # bulk_create sends no signals.
+                    post_save.send(sender=User, instance=user, created=True, raw=False,
+                                   using=user._state.db, update_fields=None)
+            team.players.add(*users.values())
+
+        missing = set(missing)
+        results = []
+        for phone in phones:
+            normalized = self.normalize_phone(phone)
+            if normalized in invalid:
+                results.append({'phone': normalized, 'error': invalid[normalized]})
+            elif normalized:
+                results.append({'phone': normalized, 'user_id': users[normalized].id,
+                                'user_exists': normalized not in missing})
+            else:
+                results.append({'phone': str(phone), 'error': 'неверный телефон'})
+        return Response({'results': results}, status=status.HTTP_201_CREATED)
+
+    @staticmethod
+    def validate_users(phones: list) -> tuple():
+        """
+        Same validation as UpdateTeamAndCreateUser, one serializer for all phones.
+        :return: (validated data of valid phones, phone -> errors of invalid ones)
+        """
+        items = [{'phone': phone, 'password': phone[-4:]} for phone in phones]
+        serializer = CreateUserSerializer(data=items, many=True)
+        if serializer.is_valid():
+            return serializer.validated_data, {}
+        errors = serializer.errors
+        if isinstance(errors, dict):
+            # Newer DRF: only invalid items, by index.
+            errors = [errors.get(idx) for idx in range(len(phones))]
+        invalid = {phone: errors for phone, errors in zip(phones, errors) if errors}
+        items = [item for item in items if item['phone'] not in invalid]
+        serializer = CreateUserSerializer(data=items, many=True)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data, invalid
+
+
+class HumanExportCsvView(APIView):
+    """
+    All humans as CSV-file for CsvToPptx, streamed: GET ?city=&level_english=&skills=1,2
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        try:
+            skills = [int(skill) for skill in params.get('skills', '').split(',') if skill]
+        except ValueError as e:
+            return Response(data={'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        humans = Human.objects.search(city=params.get('city'), level_english=params.get('level_english'),
+                                      skills=skills)
+        return csv_response(humans)
@@ -0,0 +1,192 @@
+import time
+import datetime
+import queue
+import logging
+import threading
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+from .models import TeamChat
+
+
+logger = logging.getLogger(__name__)
+
+# Class of bot: anything with add_group_and_promote(phone, chatName) -> dict,
+# e.g. fake bot in tests: WABOT_CLASS = "tests.fakes.FakeWABot".
+WABOT_CLASS_DEFAULT = "wabot.wabot.WABot"
+
+# Errors after which the request surely didn't reach WhatsApp, only they are retried:
+# adding group is not idempotent, after any other error (e.g. read timeout) the group
+# may exist and next attempt would create second one. Setting WABOT_RETRY_ERRORS.
+WABOT_RETRY_ERRORS_DEFAULT = ("builtins.ConnectionRefusedError", "requests.exceptions.ConnectTimeout")
+
+
+def import_errors(paths) -> tuple():
+    """
+    :param paths: dotted paths of exception classes, missing ones are skipped
+    :return: tuple of classes for except
+    """
+    errors = []
+    for path in paths:
+        try:
+            errors.append(import_string(path))
+        except ImportError:
+            logger.debug("retry error %s is not importable", path)
+    return tuple(errors)
+
+
+class WAGroupWorker:
+    """
+    Background threads which create WhatsApp groups of TeamChat and
+    fill WA_chatId of Team. One bot per thread, reused between jobs.
+    """
+
+    def __init__(self,
+                 bot_factory=None,
+                 threads: int = 2,
+                 retries: int = 3,
+                 backoff: float = 1.0,
+                 retry_errors: tuple = None):
+        """
+        :param bot_factory: callable() -> bot, None - settings.WABOT_CLASS
+        :param threads: number of threads
+        :param retries: attempts of one job, then it is failed
+        :param backoff: seconds before 2nd attempt, doubled for each next one
+        :param retry_errors: exception classes safe to retry, None - settings.WABOT_RETRY_ERRORS
+        """
+        self.bot_factory = bot_factory or import_string(getattr(settings, "WABOT_CLASS", WABOT_CLASS_DEFAULT))
+        self.threads = threads
+        self.retries = retries
+        self.backoff = backoff
+        if retry_errors is None:
+            retry_errors = import_errors(getattr(settings, "WABOT_RETRY_ERRORS", WABOT_RETRY_ERRORS_DEFAULT))
+        self.retry_errors = retry_errors
+        self.jobs = queue.Queue()
+        self.local = threading.local()
+        self.workers = []
+        self.lock = threading.Lock()
+
+    def bot(self):
+        if not hasattr(self.local, "bot"):
+            self.local.bot = self.bot_factory()
+        return self.local.bot
+
+    def start(self) -> None:
+        with self.lock:
+            if self.workers:
+                return
+            for _ in range(self.threads):
+                worker = threading.Thread(target=self.run, daemon=True)
+                worker.start()
+                self.workers.append(worker)
+
+    def stop(self) -> None:
+        with self.lock:
+            for _ in self.workers:
+                self.jobs.put(None)
+            for worker in self.workers:
+                worker.join()
+            self.workers = []
+
+    def submit(self, chat_id: int) -> None:
+        """
+        :param chat_id: id of TeamChat, call after transaction with it is committed
+        """
+        self.start()
+        self.jobs.put(chat_id)
+
+    def run(self) -> None:
+        while True:
+            chat_id = self.jobs.get()
+            if chat_id is None:
+                return
+            try:
+                self.process(chat_id)
+            except Exception:
+                logger.exception("TeamChat %s: unexpected error", chat_id)
+            finally:
+                close_old_connections()
+
+    def process(self, chat_id: int) -> bool:
+        """
+        Create group of one TeamChat. Only one caller gets the pending job,
+        so repeated submit() and several workers don't create two groups.
+        Attempt is repeated only after retry_errors, other errors and answer
+        without groupId fail the job at once: group may exist, check it by hand.
+        :return: True if group was created
+        """
+        claimed = TeamChat.objects.filter(pk=chat_id, status=TeamChat.STATUS_PENDING).update(
+            status=TeamChat.STATUS_RUNNING)
+        if not claimed:
+            return False
+        try:
+            return self.create_group(TeamChat.objects.select_related("team").get(pk=chat_id))
+        except Exception as e:
+            # E.g. database is gone while saving result: claimed chat must not stay running,
+            # nobody takes it again.
+            error = "{0}: {1} (group may exist, not retried)".format(type(e).__name__, e)
+            logger.exception("TeamChat %s: %s", chat_id, error)
+            TeamChat.objects.filter(pk=chat_id, status=TeamChat.STATUS_RUNNING).update(
+                status=TeamChat.STATUS_FAILED, error=error, modified_at=datetime.date.today())
+            return False
+
+    def create_group(self, chat: TeamChat) -> bool:
+        """
+        Attempts of process(), chat is claimed by it.
+        :return: True if group was created
+        """
+        chat_id = chat.pk
+        error = ""
+        for attempt in range(self.retries):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            chat.attempts += 1
+            try:
+                bot = self.bot()
+            except Exception as e:
+                # Nothing was sent yet.
+                error = "{0}: {1}".format(type(e).__name__, e)
+                logger.warning("TeamChat %s: attempt %d: %s", chat_id, chat.attempts, error)
+                continue
+            try:
+                response = bot.add_group_and_promote(phone=chat.phone, chatName=chat.chat_name)
+            except self.retry_errors as e:
+                # Bot may be broken (e.g. closed session): new one for next attempt.
+                self.local.__dict__.pop("bot", None)
+                error = "{0}: {1}".format(type(e).__name__, e)
+                logger.warning("TeamChat %s: attempt %d: %s", chat_id, chat.attempts, error)
+                continue
+            except Exception as e:
+                self.local.__dict__.pop("bot", None)
+                error = "{0}: {1} (group may exist, not retried)".format(type(e).__name__, e)
+                logger.error("TeamChat %s: attempt %d: %s", chat_id, chat.attempts, error)
+                break
+            group_id = (response or {}).get('groupId')
+            if group_id:
+                chat.team.WA_chatId = group_id
+                chat.team.save(update_fields=["WA_chatId"])
+                chat.status, chat.error = TeamChat.STATUS_DONE, ""
+                chat.save(update_fields=["status", "error", "attempts", "modified_at"])
+                return True
+            error = "no groupId in response (group may exist, not retried): {0}".format(response)
+            logger.error("TeamChat %s: attempt %d: %s", chat_id, chat.attempts, error)
+            break
+        chat.status, chat.error = TeamChat.STATUS_FAILED, error
+        chat.save(update_fields=["status", "error", "attempts", "modified_at"])
+        return False
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_worker() -> WAGroupWorker:
+    """
+    :return: worker of process, created on first call
+    """
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = WAGroupWorker(threads=getattr(settings, "WABOT_THREADS", 2),
+                                    retries=getattr(settings, "WABOT_RETRIES", 3))
+        return _worker